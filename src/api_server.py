@@ -0,0 +1,144 @@
+import asyncio
+import datetime
+import hashlib
+import json
+import os
+
+import tornado.web
+from cachetools import TTLCache
+from dotenv import load_dotenv
+from prisma import Prisma
+
+import db_integration as db
+
+load_dotenv()
+
+API_PORT = int(os.getenv("API_PORT", "8000"))
+# Seconds a response stays in the in-process cache. Data only changes once per bot cycle,
+# so a short TTL keeps responses fresh while repeated polls never reach the database.
+API_CACHE_TTL = float(os.getenv("API_CACHE_TTL", "30"))
+MAX_PAGE_SIZE = 200
+
+# Least recently used responses are evicted first once the cache is full
+cache = TTLCache(maxsize=512, ttl=API_CACHE_TTL)
+
+class CachedJSONHandler(tornado.web.RequestHandler):
+  """
+  Base handler serving a JSON document from the in-process LRU cache.
+
+  Subclasses implement `load`. Responses carry an ETag derived from the body, and a request
+  whose If-None-Match matches it gets an empty 304 response.
+  """
+
+  def initialize(self, prisma: Prisma):
+    self.prisma = prisma
+
+  async def load(self):
+    raise NotImplementedError
+
+  def get_page_arguments(self):
+    try:
+      page = int(self.get_argument("page", "1"))
+      page_size = int(self.get_argument("page_size", "50"))
+    except ValueError:
+      raise tornado.web.HTTPError(400, "page and page_size must be integers")
+    if page < 1 or not 1 <= page_size <= MAX_PAGE_SIZE:
+      raise tornado.web.HTTPError(400, "page must be >= 1 and page_size between 1 and {0}".format(MAX_PAGE_SIZE))
+    return page, page_size
+
+  async def get(self):
+    key = self.request.uri
+    cached = cache.get(key)
+    if cached is None:
+      body = json.dumps(await self.load()).encode("utf-8")
+      cached = (body, '"{0}"'.format(hashlib.sha1(body).hexdigest()))
+      cache[key] = cached
+    body, etag = cached
+
+    self.set_header("Etag", etag)
+    self.set_header("Cache-Control", "max-age={0:.0f}".format(API_CACHE_TTL))
+    if self.check_etag_header():
+      self.set_status(304)
+      return
+    self.set_header("Content-Type", "application/json")
+    self.write(body)
+
+class TradesHandler(CachedJSONHandler):
+  async def load(self):
+    page, page_size = self.get_page_arguments()
+    return await db.get_trades_page(page, page_size, prisma=self.prisma)
+
+class ReflectionsHandler(CachedJSONHandler):
+  async def load(self):
+    page, page_size = self.get_page_arguments()
+    return await db.get_reflections_page(page, page_size, prisma=self.prisma)
+
+class InsightsHandler(CachedJSONHandler):
+  async def load(self):
+    page, page_size = self.get_page_arguments()
+    return await db.get_insights_page(page, page_size, prisma=self.prisma)
+
+class CycleMetricsHandler(CachedJSONHandler):
+  async def load(self):
+    page, page_size = self.get_page_arguments()
+    return await db.get_cycle_metrics_page(page, page_size, prisma=self.prisma)
+
+class ModelMetricsHandler(CachedJSONHandler):
+  async def load(self):
+    return await db.get_model_vote_stats(prisma=self.prisma)
+
+class PnlHandler(CachedJSONHandler):
+  async def load(self):
+    period = self.get_argument("period", "day")
+    if period not in ("day", "hour"):
+      raise tornado.web.HTTPError(400, "period must be day or hour")
+    since = self.get_argument("since", None)
+    if since is not None:
+      try:
+        since = datetime.datetime.fromisoformat(since)
+      except ValueError:
+        raise tornado.web.HTTPError(400, "since must be an ISO formatted date")
+
+    rollups = await db.get_rollups(period, since, prisma=self.prisma)
+    return [
+      {
+        "bucket": rollup.bucket.isoformat(),
+        "totalPnl": rollup.totalPnl,
+        "realizedPnl": rollup.realizedPnl,
+        "closePrice": rollup.closePrice,
+        "marketReturn": rollup.marketReturn,
+        "buyCount": rollup.buyCount,
+        "sellCount": rollup.sellCount,
+        "holdCount": rollup.holdCount,
+        "krwVolume": rollup.krwVolume,
+      }
+      for rollup in rollups
+    ]
+
+def make_app(prisma: Prisma) -> tornado.web.Application:
+  """Create the read-only API application on top of a connected Prisma client."""
+
+  args = {"prisma": prisma}
+  return tornado.web.Application([
+    (r"/trades", TradesHandler, args),
+    (r"/reflections", ReflectionsHandler, args),
+    (r"/insights", InsightsHandler, args),
+    (r"/pnl", PnlHandler, args),
+    (r"/metrics/cycles", CycleMetricsHandler, args),
+    (r"/metrics/models", ModelMetricsHandler, args),
+  ])
+
+async def serve(port: int = API_PORT):
+  """Serve the API until the process is stopped, sharing one database connection."""
+
+  prisma = Prisma()
+  await prisma.connect()
+  try:
+    make_app(prisma).listen(port)
+    print("Serving the AI-BITCOIN API on port {0}".format(port))
+    await asyncio.Event().wait()
+  finally:
+    await prisma.disconnect()
+
+if __name__ == "__main__":
+  asyncio.run(serve())
@@ -1,10 +1,15 @@
 if __name__ == "__main__":
-  from news import collect_news
-  from upbit_chart import get_chart_data
-  from fear_greed_index import get_fear_greed_index
+  from news import collect_news, load_cached_news
+  from upbit_chart import get_chart_data, load_cached_chart_data
+  from fear_greed_index import get_fear_greed_index, load_cached_fear_greed_index
+  from tick_features import load_intraday_features
 else:
-  from data_collection.news import collect_news
-  from data_collection.upbit_chart import get_chart_data
-  from data_collection.fear_greed_index import get_fear_greed_index
+  from data_collection.news import collect_news, load_cached_news
+  from data_collection.upbit_chart import get_chart_data, load_cached_chart_data
+  from data_collection.fear_greed_index import get_fear_greed_index, load_cached_fear_greed_index
+  from data_collection.tick_features import load_intraday_features
 
-__all__ = ["collect_news", "get_chart_data", "get_fear_greed_index"]
\ No newline at end of file
+__all__ = [
+  "collect_news", "get_chart_data", "get_fear_greed_index", "load_intraday_features",
+  "load_cached_news", "load_cached_chart_data", "load_cached_fear_greed_index",
+]
\ No newline at end of file
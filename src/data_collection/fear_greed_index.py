@@ -1,7 +1,12 @@
-import requests
-import json
+import os
+import sys
+
+if __name__ == "__main__":
+  sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import http_client
 
 url = "https://api.alternative.me/fng/?limit="
+CACHE_KEY = "fear_greed_index"
 
 def get_fear_greed_index():
   """
@@ -9,27 +14,27 @@ def get_fear_greed_index():
 
   This function constructs a URL by appending the character "2" to a base URL, sends a GET request to the
   constructed URL, and parses the JSON response. It then extracts and returns the "value" field from the first
-  element in the "data" list.
+  element in the "data" list. If the API cannot be reached, the last successfully fetched response is used.
 
   Returns:
     The fear and greed index value extracted from the JSON response.
 
   Raises:
     KeyError: If the expected keys ('data' or 'value') are not present in the JSON response.
-    json.JSONDecodeError: If the response text is not valid JSON.
-    requests.RequestException: For issues encountered during the HTTP request.
-
-  Note:
-    This function requires that the variables 'url', 'requests', and 'json' are defined in the surrounding scope.
+    requests.RequestException: For issues encountered during the HTTP request when nothing is cached yet.
   """
 
   _url = "{0}2".format(url) # Construct the URL
-  res = requests.request("GET", _url) # Send the GET request
+  parsed = http_client.get_json(_url, cache_key=CACHE_KEY) # Send the GET request and parse the JSON response
 
-  parsed = json.loads(res.text) # Parse the JSON response
   data = parsed["data"] # Extract the 'data' field from the response
 
   return data[0]["value"] # Extract and return the 'value' field from the first element in the 'data' list
 
+def load_cached_fear_greed_index():
+  """Return the index value from the last successful `get_fear_greed_index` call, or None."""
+  parsed = http_client.load_cached(CACHE_KEY)[0]
+  return parsed["data"][0]["value"] if parsed else None
+
 if __name__ == "__main__":
   print(get_fear_greed_index())
@@ -1,17 +1,36 @@
-import requests
 import os
+import sys
 from dotenv import load_dotenv
 from datetime import datetime
 import json
 from newspaper import Article
 from newspaper import Config
 
+if __name__ == "__main__":
+  sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import http_client
+
 load_dotenv()
 
 NEWS_API_KEY = os.getenv("NEWS_API_KEY")
 user_agent = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/133.0.0.0 Safari/537.36" # User agent for the Article parser
 
 def collect_news(query="Stock Market Bitcoin", page_size=10):
+  """
+  Collect recent news articles and their text. If the News API cannot be reached,
+  the articles collected by the last successful call are returned instead.
+  """
+
+  return http_client.with_fallback(
+    "news:{0}:{1}".format(query, page_size),
+    lambda: _fetch_news(query, page_size)
+  )
+
+def load_cached_news(query="Stock Market Bitcoin", page_size=10):
+  """Return the articles stored by the last successful `collect_news` call, or None."""
+  return http_client.load_cached("news:{0}:{1}".format(query, page_size))[0]
+
+def _fetch_news(query, page_size):
   url = "https://newsapi.org/v2/everything"
   params = {
     "q": query,
@@ -20,11 +39,10 @@ def collect_news(query="Stock Market Bitcoin", page_size=10):
     "pageSize": page_size,
     "apiKey": NEWS_API_KEY
   }
-  response = requests.get(url, params=params)
-  data = response.json()
+  data = http_client.get(url, params=params).json()
 
   if data["status"] != "ok":
-    raise Exception(f"News API error: {data.get("message", "Unknown error")}")
+    raise Exception("News API error: {0}".format(data.get("message", "Unknown error")))
 
   articles = data["articles"]
   
@@ -44,7 +62,8 @@ def collect_news(query="Stock Market Bitcoin", page_size=10):
     article = Article(url, config=config)
     # Download and parse the article
     try:
-      article.download()
+      html = http_client.get(url, headers={"User-Agent": user_agent}, retries=0).text
+      article.download(input_html=html)
       article.parse()
     except: # Skip to the next article if website of article is not accessible with bots.
       print("Not accessable")
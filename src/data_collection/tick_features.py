@@ -0,0 +1,268 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import time
+import uuid
+
+import websockets
+
+UPBIT_WS_URL = "wss://api.upbit.com/websocket/v1"
+FEATURES_PATH = os.getenv(
+  "TICK_FEATURES_PATH",
+  os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), ".cache", "tick_features.json")
+)
+
+class RingBuffer:
+  """
+  Fixed-size buffer of numbers. Appending to a full buffer overwrites and returns the oldest value.
+  """
+
+  __slots__ = ("values", "size", "start", "count")
+
+  def __init__(self, size: int):
+    self.values = [0.0] * size
+    self.size = size
+    self.start = 0
+    self.count = 0
+
+  def append(self, value: float):
+    if self.count < self.size:
+      self.values[(self.start + self.count) % self.size] = value
+      self.count += 1
+      return None
+    evicted = self.values[self.start]
+    self.values[self.start] = value
+    self.start = (self.start + 1) % self.size
+    return evicted
+
+  def __len__(self):
+    return self.count
+
+  def __getitem__(self, i: int) -> float:
+    """Index from the oldest value (0) or from the newest value (-1)."""
+    if i < 0:
+      i += self.count
+    if not 0 <= i < self.count:
+      raise IndexError("RingBuffer index out of range")
+    return self.values[(self.start + i) % self.size]
+
+class TickAggregator:
+  """
+  Builds intraday features from individual trades in O(1) per tick.
+
+  Trades are folded into one-minute bars. Closed bars are kept in ring buffers covering the
+  last `window` minutes, and running sums over those buffers are updated as bars enter and
+  leave the window, so the features never rescan history. The features cover the closed bars
+  plus the still open bar, so a full window spans `window + 1` minutes (reported as
+  `window_minutes`):
+
+  - vwap: volume weighted average price over the window (including the open bar)
+  - realized_volatility: square root of the summed squared one-minute log returns
+  - order_flow_imbalance: (buy volume - sell volume) / total volume, from the taker side
+  - window_return: % change from the oldest close in the window to the last price
+
+  Ticks are dicts in Upbit's trade format (trade_price, trade_volume, ask_bid, trade_timestamp).
+  """
+
+  def __init__(self, window: int = 60):
+    self.window = window
+    self.closes = RingBuffer(window)
+    self.volumes = RingBuffer(window)
+    self.price_volumes = RingBuffer(window)
+    self.buy_volumes = RingBuffer(window)
+    self.sell_volumes = RingBuffer(window)
+    self.squared_returns = RingBuffer(window)
+    self.sum_volume = 0.0
+    self.sum_price_volume = 0.0
+    self.sum_buy_volume = 0.0
+    self.sum_sell_volume = 0.0
+    self.sum_squared_returns = 0.0
+    self.bar_minute = None
+    self.bar = None
+    self.last_price = None
+    self.last_tick_time = None
+    self.tick_count = 0
+
+  def _new_bar(self, price: float) -> dict:
+    return {
+      "open": price, "high": price, "low": price, "close": price,
+      "volume": 0.0, "price_volume": 0.0, "buy_volume": 0.0, "sell_volume": 0.0,
+    }
+
+  def _push(self, buffer: RingBuffer, value: float) -> float:
+    evicted = buffer.append(value)
+    return value - (evicted or 0.0)
+
+  def _close_bar(self, bar: dict):
+    previous_close = self.closes[-1] if len(self.closes) else None
+    squared_return = math.log(bar["close"] / previous_close) ** 2 if previous_close else 0.0
+
+    self.closes.append(bar["close"])
+    self.sum_volume += self._push(self.volumes, bar["volume"])
+    self.sum_price_volume += self._push(self.price_volumes, bar["price_volume"])
+    self.sum_buy_volume += self._push(self.buy_volumes, bar["buy_volume"])
+    self.sum_sell_volume += self._push(self.sell_volumes, bar["sell_volume"])
+    self.sum_squared_returns += self._push(self.squared_returns, squared_return)
+
+  def update(self, tick: dict):
+    """Fold one trade tick into the current bar, closing finished bars first."""
+
+    price = float(tick["trade_price"])
+    volume = float(tick["trade_volume"])
+    timestamp = tick["trade_timestamp"] / 1000
+    minute = int(timestamp // 60)
+
+    if self.bar_minute is None:
+      self.bar_minute = minute
+      self.bar = self._new_bar(price)
+    elif minute > self.bar_minute:
+      self._close_bar(self.bar)
+      # Minutes without trades become flat bars, at most one window's worth
+      for _ in range(min(minute - self.bar_minute - 1, self.window)):
+        self._close_bar(self._new_bar(self.bar["close"]))
+      self.bar_minute = minute
+      self.bar = self._new_bar(price)
+
+    bar = self.bar
+    bar["high"] = max(bar["high"], price)
+    bar["low"] = min(bar["low"], price)
+    bar["close"] = price
+    bar["volume"] += volume
+    bar["price_volume"] += price * volume
+    if tick["ask_bid"] == "BID":
+      bar["buy_volume"] += volume
+    else:
+      bar["sell_volume"] += volume
+
+    self.last_price = price
+    self.last_tick_time = timestamp
+    self.tick_count += 1
+
+  def features(self) -> dict:
+    """
+    Return the latest intraday features, or an empty dict before the first tick.
+
+    `window_minutes` is the number of minute bars the features cover, including the open bar.
+    """
+
+    if self.bar is None:
+      return {}
+
+    volume = self.sum_volume + self.bar["volume"]
+    buy_volume = self.sum_buy_volume + self.bar["buy_volume"]
+    sell_volume = self.sum_sell_volume + self.bar["sell_volume"]
+    oldest_close = self.closes[0] if len(self.closes) else self.bar["open"]
+
+    return {
+      "last_price": self.last_price,
+      "last_tick_time": self.last_tick_time,
+      "window_minutes": len(self.closes) + 1,
+      "vwap": (self.sum_price_volume + self.bar["price_volume"]) / volume if volume else self.last_price,
+      "realized_volatility": math.sqrt(max(self.sum_squared_returns, 0.0)),
+      "order_flow_imbalance": (buy_volume - sell_volume) / (buy_volume + sell_volume) if volume else 0.0,
+      "window_return": (self.last_price - oldest_close) / oldest_close * 100,
+      "volume": volume,
+      "current_bar": {key: self.bar[key] for key in ("open", "high", "low", "close", "volume")},
+    }
+
+async def stream_ticks(ticker: str = "KRW-BTC", record_path: str = None):
+  """
+  Yield live trade ticks from the Upbit WebSocket API, reconnecting when the connection drops.
+
+  Parameters:
+    ticker (str): The market code to subscribe to.
+    record_path (str): Optional JSON lines file every tick is appended to, for later replay.
+  """
+
+  record = open(record_path, "a", encoding="utf-8") if record_path else None
+  try:
+    while True:
+      try:
+        async with websockets.connect(UPBIT_WS_URL, ping_interval=60) as ws:
+          await ws.send(json.dumps([
+            {"ticket": str(uuid.uuid4())},
+            {"type": "trade", "codes": [ticker]},
+            {"format": "DEFAULT"}
+          ]))
+          async for message in ws:
+            tick = json.loads(message)
+            if record:
+              record.write(json.dumps(tick) + "\n")
+            yield tick
+      except (websockets.ConnectionClosed, OSError) as e:
+        print("Upbit WebSocket disconnected, reconnecting: {0}".format(e))
+        await asyncio.sleep(1)
+  finally:
+    if record:
+      record.close()
+
+async def replay_ticks(path: str):
+  """Yield ticks recorded by `stream_ticks` from a JSON lines file, as fast as they can be read."""
+
+  with open(path, "r", encoding="utf-8") as f:
+    for line in f:
+      if line.strip():
+        yield json.loads(line)
+
+def save_features(features: dict, path: str = FEATURES_PATH):
+  """Atomically write the latest features so other processes can read them."""
+  os.makedirs(os.path.dirname(path), exist_ok=True)
+  with open(path + ".tmp", "w", encoding="utf-8") as f:
+    json.dump(features, f)
+  os.replace(path + ".tmp", path)
+
+def load_intraday_features(path: str = FEATURES_PATH, max_age: float = 300):
+  """
+  Read the latest features written by a running tick aggregator.
+
+  Parameters:
+    path (str): The features file written by `run`.
+    max_age (float): Seconds after which the last tick is considered too old to use.
+
+  Returns:
+    dict or None: The features, or None if no aggregator is running or its data is stale.
+  """
+
+  try:
+    with open(path, "r", encoding="utf-8") as f:
+      features = json.load(f)
+  except (OSError, ValueError):
+    return None
+  if not features or time.time() - features["last_tick_time"] > max_age:
+    return None
+  return features
+
+async def run(ticks, aggregator: TickAggregator, path: str = FEATURES_PATH, save_interval: float = 1.0):
+  """
+  Feed ticks into the aggregator and save its features every `save_interval` seconds.
+
+  Returns:
+    dict: The final features once the tick source is exhausted.
+  """
+
+  last_saved = 0.0
+  async for tick in ticks:
+    aggregator.update(tick)
+    now = time.monotonic()
+    if now - last_saved >= save_interval:
+      save_features(aggregator.features(), path)
+      last_saved = now
+
+  features = aggregator.features()
+  save_features(features, path)
+  return features
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Build intraday features from Upbit trade ticks.")
+  parser.add_argument("--replay", help="Replay ticks from a JSON lines file instead of the WebSocket")
+  parser.add_argument("--record", help="Append live ticks to a JSON lines file")
+  parser.add_argument("--window", type=int, default=60, help="Window length in minutes")
+  args = parser.parse_args()
+
+  source = replay_ticks(args.replay) if args.replay else stream_ticks(record_path=args.record)
+  aggregator = TickAggregator(window=args.window)
+  started = time.monotonic()
+  print(json.dumps(asyncio.run(run(source, aggregator))))
+  print("Processed {0} ticks in {1:.2f}s".format(aggregator.tick_count, time.monotonic() - started))
@@ -1,22 +1,39 @@
+import os
+import sys
 import pyupbit
 
+if __name__ == "__main__":
+  sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import http_client
+
+CACHE_KEY = "upbit_chart:KRW-BTC:day:30"
+
 def get_chart_data():
   """
   Fetches daily OHLCV chart data for the KRW-BTC pair and returns it as a JSON string.
 
   This function retrieves the open, high, low, close, and volume data for KRW-BTC for the past 30 days 
   using the pyupbit library's get_ohlcv method with a daily interval. The resulting DataFrame is then 
-  converted to a JSON format.
+  converted to a JSON format. If the data cannot be fetched, the last successfully fetched chart is returned.
 
   Returns:
     str: A JSON string representing the OHLCV data for KRW-BTC.
 
   Raises:
-    Exception: Propagates exceptions raised by pyupbit.get_ohlcv if the data retrieval fails.
+    Exception: Propagates exceptions raised by pyupbit.get_ohlcv if the data retrieval fails and nothing is cached.
   """
-  
-  df = pyupbit.get_ohlcv("KRW-BTC", count=30, interval="day")
-  return df.to_json()
+
+  def fetch():
+    df = pyupbit.get_ohlcv("KRW-BTC", count=30, interval="day")
+    if df is None:
+      raise Exception("Failed to fetch chart data from Upbit")
+    return df.to_json()
+
+  return http_client.with_fallback(CACHE_KEY, fetch)
+
+def load_cached_chart_data():
+  """Return the chart stored by the last successful `get_chart_data` call, or None."""
+  return http_client.load_cached(CACHE_KEY)[0]
 
 if __name__ == "__main__":
   result = get_chart_data()
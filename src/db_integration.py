@@ -1,6 +1,28 @@
 import asyncio
+import datetime
+from contextlib import asynccontextmanager
 from prisma import Prisma
 
+@asynccontextmanager
+async def connect(prisma: Prisma = None):
+  """
+  Yield a connected Prisma client.
+
+  If a connected client is passed (eg., by a long running server), it is reused and left
+  connected. Otherwise a new client is connected and disconnected afterwards.
+  """
+
+  if prisma is not None:
+    yield prisma
+    return
+
+  prisma = Prisma()
+  await prisma.connect()
+  try:
+    yield prisma
+  finally:
+    await prisma.disconnect()
+
 async def record_trade(
 	decision: str,
   reason: str,
@@ -143,5 +165,286 @@ async def get_past_trades(count: int):
   
   return formatted_trades
 
+async def record_model_votes(trade_id: int, votes: list):
+  """
+  Record the votes of every ensemble member asked for a trade decision.
+
+  Parameters:
+    trade_id (int): The id of the trade the votes led to.
+    votes (list): Votes as returned by `openai_integration.get_ensemble_trade_decision`.
+
+  Returns:
+    int: The number of recorded votes.
+  """
+
+  prisma = Prisma()
+  await prisma.connect()
+
+  count = await prisma.modelvote.create_many(
+    data=[
+      {
+        "model": vote["model"],
+        "reasoningEffort": vote["reasoning_effort"],
+        "weight": vote["weight"],
+        "status": vote["status"],
+        "decision": vote["decision"],
+        "amount": int(round(vote["amount"])) if vote["amount"] is not None else None,
+        "latency": vote["latency"],
+        "agreed": vote["agreed"],
+        "tradeId": trade_id
+      }
+      for vote in votes
+    ]
+  )
+
+  await prisma.disconnect()
+
+  return count
+
+async def get_model_vote_stats(prisma: Prisma = None):
+  """
+  Summarize the recorded ensemble votes per model and reasoning effort.
+
+  Returns:
+    List[Dict]: One dictionary per model and reasoning effort with:
+      - model: The model name.
+      - reasoningEffort: The reasoning effort, or None.
+      - votes: The number of times the member was asked.
+      - errorRate: The share of calls that failed.
+      - lateRate: The share of calls answered after the ensemble had already decided.
+      - timeoutRate: The share of calls that never answered, even after the cycle.
+      - avgLatency (float or None): The average latency in seconds of answered calls, including late ones.
+      - agreementRate (float or None): The share of answered calls that matched the combined decision.
+  """
+
+  async with connect(prisma) as prisma:
+    votes = await prisma.modelvote.find_many()
+
+  grouped = {}
+  for vote in votes:
+    grouped.setdefault((vote.model, vote.reasoningEffort), []).append(vote)
+
+  stats = []
+  for (model, reasoning_effort), group in grouped.items():
+    answered = [vote for vote in group if vote.status in ("OK", "LATE")]
+    stats.append({
+      "model": model,
+      "reasoningEffort": reasoning_effort,
+      "votes": len(group),
+      "errorRate": sum(vote.status == "ERROR" for vote in group) / len(group),
+      "lateRate": sum(vote.status == "LATE" for vote in group) / len(group),
+      "timeoutRate": sum(vote.status == "TIMEOUT" for vote in group) / len(group),
+      "avgLatency": sum(vote.latency for vote in answered) / len(answered) if answered else None,
+      "agreementRate": sum(bool(vote.agreed) for vote in answered) / len(answered) if answered else None,
+    })
+
+  return stats
+
+async def get_rollups(period: str = "day", since: datetime.datetime = None, prisma: Prisma = None):
+  """
+  Retrieve performance rollup rows in chronological order.
+
+  Parameters:
+    period (str): "day" or "hour".
+    since (datetime): Only return buckets starting at or after this time.
+    prisma (Prisma): Connected client to reuse, see `connect`.
+
+  Returns:
+    list: PerformanceRollup records.
+  """
+
+  where = {"period": period}
+  if since is not None:
+    where["bucket"] = {"gte": since}
+
+  async with connect(prisma) as prisma:
+    return await prisma.performancerollup.find_many(where=where, order={"bucket": "asc"})
+
+async def record_cycle_metric(
+  started_time: datetime.datetime,
+  duration: float,
+  status: str,
+  error: str = None,
+  trade_id: int = None,
+  budget: float = None,
+  scheduled_time: datetime.datetime = None,
+  missed_ticks: int = 0
+):
+  """
+  Record the measured duration and outcome of a bot cycle.
+
+  Parameters:
+    started_time (datetime): When the cycle started.
+    duration (float): How long the cycle took, in seconds.
+    status (str): OK, ERROR, TIMEOUT or SKIPPED.
+    error (str): The error message of a failed cycle.
+    trade_id (int): The id of the trade recorded by the cycle, if any.
+    budget (float): The cycle's time budget in seconds, if any.
+    scheduled_time (datetime): When the scheduler planned to start the cycle.
+    missed_ticks (int): Scheduled cycles skipped since the previous cycle.
+
+  Returns:
+    The newly created cycle metric record.
+  """
+
+  async with connect() as prisma:
+    return await prisma.cyclemetric.create(
+      data={
+        "startedTime": started_time,
+        "duration": duration,
+        "status": status,
+        "error": error,
+        "tradeId": trade_id,
+        "budget": budget,
+        "scheduledTime": scheduled_time,
+        "missedTicks": missed_ticks
+      }
+    )
+
+async def record_snapshot(trade_id: int, manifest_hash: str):
+  """
+  Link the stored input snapshot of a cycle to the trade it led to.
+
+  Parameters:
+    trade_id (int): The id of the trade.
+    manifest_hash (str): The snapshot hash returned by `snapshots.save_snapshot`.
+
+  Returns:
+    The newly created snapshot record.
+  """
+
+  async with connect() as prisma:
+    return await prisma.cyclesnapshot.create(
+      data={
+        "manifestHash": manifest_hash,
+        "tradeId": trade_id
+      }
+    )
+
+async def get_snapshots(first_trade_id: int = None, last_trade_id: int = None):
+  """
+  Retrieve the trades with a stored input snapshot, oldest first.
+
+  Parameters:
+    first_trade_id (int): Lowest trade id to include.
+    last_trade_id (int): Highest trade id to include.
+
+  Returns:
+    List[Dict]: One dictionary per trade with tradeId, decision, amount, tradedTime (ISO formatted)
+      and manifestHash.
+  """
+
+  trade_id = {}
+  if first_trade_id is not None:
+    trade_id["gte"] = first_trade_id
+  if last_trade_id is not None:
+    trade_id["lte"] = last_trade_id
+
+  async with connect() as prisma:
+    snapshots = await prisma.cyclesnapshot.find_many(
+      where={"tradeId": trade_id} if trade_id else None,
+      order={"tradeId": "asc"},
+      include={"trade": True}
+    )
+
+  return [
+    {
+      "tradeId": snapshot.tradeId,
+      "decision": snapshot.trade.decision,
+      "amount": snapshot.trade.amount,
+      "tradedTime": snapshot.trade.tradedTime.isoformat(),
+      "manifestHash": snapshot.manifestHash,
+    }
+    for snapshot in snapshots
+  ]
+
+async def _get_page(model, page: int, page_size: int, order: dict, format_item):
+  total = await model.count()
+  items = await model.find_many(
+    skip=(page - 1) * page_size,
+    take=page_size,
+    order=order
+  )
+  return {
+    "page": page,
+    "pageSize": page_size,
+    "total": total,
+    "items": [format_item(item) for item in items]
+  }
+
+async def get_trades_page(page: int = 1, page_size: int = 50, prisma: Prisma = None):
+  """
+  Retrieve one page of trades, newest first.
+
+  Parameters:
+    page (int): The 1-based page number.
+    page_size (int): The number of trades per page.
+    prisma (Prisma): Connected client to reuse, see `connect`.
+
+  Returns:
+    Dict: page, pageSize, total and items, where each item has the trade's id, decision,
+      reason, amount, tradedTime (ISO formatted) and reflectionId.
+  """
+
+  async with connect(prisma) as prisma:
+    return await _get_page(
+      prisma.trade, page, page_size, {"tradedTime": "desc"},
+      lambda trade: {
+        "id": trade.id,
+        "decision": trade.decision,
+        "reason": trade.reason,
+        "amount": trade.amount,
+        "tradedTime": trade.tradedTime.isoformat() if trade.tradedTime else None,
+        "reflectionId": trade.reflectionId,
+      }
+    )
+
+async def get_reflections_page(page: int = 1, page_size: int = 50, prisma: Prisma = None):
+  """Retrieve one page of reflections, newest first. See `get_trades_page`."""
+
+  async with connect(prisma) as prisma:
+    return await _get_page(
+      prisma.reflection, page, page_size, {"id": "desc"},
+      lambda reflection: {
+        "id": reflection.id,
+        "reflection": reflection.reflection,
+        "recommendedActions": reflection.recommendedActions,
+        "marketTrends": reflection.marketTrends,
+        "insightsId": reflection.insightsId,
+      }
+    )
+
+async def get_insights_page(page: int = 1, page_size: int = 50, prisma: Prisma = None):
+  """Retrieve one page of insights, newest first. See `get_trades_page`."""
+
+  async with connect(prisma) as prisma:
+    return await _get_page(
+      prisma.insights, page, page_size, {"id": "desc"},
+      lambda insights: {
+        "id": insights.id,
+        "successes": insights.successes,
+        "challenges": insights.challenges,
+      }
+    )
+
+async def get_cycle_metrics_page(page: int = 1, page_size: int = 50, prisma: Prisma = None):
+  """Retrieve one page of cycle metrics, newest first. See `get_trades_page`."""
+
+  async with connect(prisma) as prisma:
+    return await _get_page(
+      prisma.cyclemetric, page, page_size, {"startedTime": "desc"},
+      lambda metric: {
+        "id": metric.id,
+        "startedTime": metric.startedTime.isoformat(),
+        "duration": metric.duration,
+        "status": metric.status,
+        "error": metric.error,
+        "tradeId": metric.tradeId,
+        "budget": metric.budget,
+        "scheduledTime": metric.scheduledTime.isoformat() if metric.scheduledTime else None,
+        "missedTicks": metric.missedTicks,
+      }
+    )
+
 if __name__ == "__main__":
   print(asyncio.run(get_past_trades(10)))
\ No newline at end of file
@@ -0,0 +1,116 @@
+import math
+import threading
+import time
+
+class DeadlineExceeded(Exception):
+  """Raised when a cycle stage does not finish within the cycle's time budget."""
+
+class Deadline:
+  """
+  Time budget of one bot cycle.
+
+  Stages run through `run` or `run_parallel` are abandoned once the budget is used up: the
+  cycle stops waiting for them and raises `DeadlineExceeded`, so a slow stage can never push
+  the cycle into the next one. Stages run through `run_optional`, and optional stages of
+  `run_parallel` (which also get their own smaller budget), use a fallback value instead, so
+  they never cost the cycle.
+
+  Abandoning a stage does not cancel it. It keeps running in its daemon thread until it
+  finishes on its own, and its result is ignored. Threads the stage started itself (eg., the
+  ensemble's thread pool) may still delay interpreter exit, so stages that can take long should
+  be given `request_timeout()` as the timeout of their own network calls.
+  """
+
+  def __init__(self, budget: float = None):
+    self.budget = budget
+    self.expires = time.monotonic() + budget if budget else math.inf
+
+  def remaining(self) -> float:
+    return max(self.expires - time.monotonic(), 0)
+
+  def request_timeout(self):
+    """Remaining seconds to use as a request timeout, or None if the budget is unlimited."""
+    return None if self.expires == math.inf else self.remaining()
+
+  def check(self, stage: str):
+    """Raise `DeadlineExceeded` if the budget is used up before `stage` starts."""
+    if self.remaining() <= 0:
+      raise DeadlineExceeded("Cycle budget of {0}s used up before {1}".format(self.budget, stage))
+
+  def _start(self, fn, args, kwargs):
+    outcome = {}
+
+    def target():
+      try:
+        outcome["result"] = fn(*args, **kwargs)
+      except BaseException as e:
+        outcome["error"] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    return thread, outcome
+
+  def _wait(self, stage: str, thread: threading.Thread, outcome: dict, expires: float = math.inf):
+    remaining = max(min(self.expires, expires) - time.monotonic(), 0)
+    thread.join(None if remaining == math.inf else remaining)
+    if thread.is_alive():
+      limit = "the cycle budget of {0}s".format(self.budget) if self.expires <= expires else "its stage budget"
+      raise DeadlineExceeded("{0} did not finish within {1}".format(stage, limit))
+    if "error" in outcome:
+      raise outcome["error"]
+    return outcome["result"]
+
+  def run(self, stage: str, fn, *args, **kwargs):
+    """
+    Run `fn(*args, **kwargs)` and return its result, or raise `DeadlineExceeded` if it is still
+    running when the budget is used up.
+    """
+
+    self.check(stage)
+    return self._wait(stage, *self._start(fn, args, kwargs))
+
+  def run_optional(self, stage: str, fallback, fn, *args, **kwargs):
+    """
+    Run `fn(*args, **kwargs)` like `run`, but return `fallback()` instead of raising if it fails
+    or is still running when the budget is used up.
+    """
+
+    try:
+      return self._wait(stage, *self._start(fn, args, kwargs))
+    except Exception as e:
+      print("Using the fallback for {0}: {1}".format(stage, e))
+      return fallback()
+
+  def run_parallel(self, stages: dict, fallbacks: dict = None, optional_budget: float = None) -> dict:
+    """
+    Run independent stages at the same time.
+
+    Stages with a fallback are optional: they may take at most `optional_budget` seconds (and
+    never more than the cycle budget), and if they fail or overrun, the result of their fallback
+    is used instead. The other stages are required and raise like `run`.
+
+    Parameters:
+      stages (dict): Functions without arguments keyed by stage name.
+      fallbacks (dict): Functions without arguments keyed by the name of an optional stage.
+      optional_budget (float): Seconds each optional stage may take, unlimited if not given.
+
+    Returns:
+      dict: The result of every stage keyed by stage name.
+    """
+
+    fallbacks = fallbacks or {}
+    self.check(", ".join(stages))
+    optional_expires = time.monotonic() + optional_budget if optional_budget else math.inf
+    started = {stage: self._start(fn, (), {}) for stage, fn in stages.items()}
+
+    results = {}
+    for stage, handle in started.items():
+      if stage not in fallbacks:
+        results[stage] = self._wait(stage, *handle)
+        continue
+      try:
+        results[stage] = self._wait(stage, *handle, expires=optional_expires)
+      except Exception as e:
+        print("Using the fallback for {0}: {1}".format(stage, e))
+        results[stage] = fallbacks[stage]()
+    return results
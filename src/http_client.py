@@ -0,0 +1,235 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+CACHE_DIR = os.getenv(
+  "HTTP_CACHE_DIR",
+  os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "http")
+)
+
+# (connect, read) timeouts in seconds, per host
+DEFAULT_TIMEOUT = (3.05, 10)
+HOST_TIMEOUTS = {
+  "newsapi.org": (3.05, 10),
+  "api.alternative.me": (3.05, 5),
+  "puuu.sh": (3.05, 5),
+}
+
+# Status codes that are worth retrying
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class CircuitOpenError(Exception):
+  """Raised when a request is refused because the host's circuit breaker is open."""
+
+class CircuitBreaker:
+  """
+  Stops calling a host after repeated failed requests.
+
+  A request counts as one failure once all its retries are used up. After `failure_threshold`
+  consecutive failed requests the breaker opens and refuses calls for
+  `reset_timeout` seconds. The first call after that is let through as a trial: a success
+  closes the breaker again, a failure reopens it.
+  """
+
+  def __init__(self, failure_threshold: int = 3, reset_timeout: float = 60):
+    self.failure_threshold = failure_threshold
+    self.reset_timeout = reset_timeout
+    self.failures = 0
+    self.opened_at = None
+    self.lock = threading.Lock()
+
+  def allow(self) -> bool:
+    with self.lock:
+      if self.opened_at is None:
+        return True
+      if time.monotonic() - self.opened_at >= self.reset_timeout:
+        # Half-open: let one trial call through and wait for its result
+        self.opened_at = time.monotonic()
+        return True
+      return False
+
+  def record_success(self):
+    with self.lock:
+      self.failures = 0
+      self.opened_at = None
+
+  def record_failure(self):
+    with self.lock:
+      self.failures += 1
+      if self.failures >= self.failure_threshold:
+        self.opened_at = time.monotonic()
+
+# Only the API hosts in HOST_TIMEOUTS get their own session and circuit breaker. Every other host
+# (eg., news article pages) shares one session, so the pools do not grow with each new domain.
+_sessions = {}
+_breakers = {}
+_lock = threading.Lock()
+
+def _new_session(pool_connections: int) -> requests.Session:
+  session = requests.Session()
+  adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=16)
+  session.mount("http://", adapter)
+  session.mount("https://", adapter)
+  return session
+
+def _get_session(host: str) -> requests.Session:
+  """Return the pooled session of an API host, or the shared session of every other host."""
+  key = host if host in HOST_TIMEOUTS else None
+  with _lock:
+    if key not in _sessions:
+      _sessions[key] = _new_session(4 if key else 16)
+    return _sessions[key]
+
+def _get_breaker(host: str):
+  """Return the circuit breaker of an API host, or None for any other host."""
+  if host not in HOST_TIMEOUTS:
+    return None
+  with _lock:
+    if host not in _breakers:
+      _breakers[host] = CircuitBreaker()
+    return _breakers[host]
+
+def request(
+  method: str,
+  url: str,
+  retries: int = 2,
+  backoff: float = 0.5,
+  **kwargs
+) -> requests.Response:
+  """
+  Send an HTTP request through the pooled session of the target host.
+
+  Connection errors, timeouts and retryable status codes (429 and 5xx) are retried up to
+  `retries` times with jittered exponential backoff. Requests to the hosts in `HOST_TIMEOUTS`
+  go through the host's circuit breaker, and every request uses the host's timeout from
+  `HOST_TIMEOUTS` unless `timeout` is given.
+
+  Parameters:
+    method (str): The HTTP method, eg., GET, POST.
+    url (str): The URL to request.
+    retries (int): How many times to retry a failed request.
+    backoff (float): Base backoff in seconds, doubled after each attempt.
+    **kwargs: Passed on to `requests.Session.request`.
+
+  Returns:
+    requests.Response: The successful response.
+
+  Raises:
+    CircuitOpenError: If the host's circuit breaker is open.
+    requests.RequestException: If the request still fails after all retries.
+  """
+
+  host = urlsplit(url).hostname
+  session = _get_session(host)
+  breaker = _get_breaker(host)
+  kwargs.setdefault("timeout", HOST_TIMEOUTS.get(host, DEFAULT_TIMEOUT))
+
+  if breaker and not breaker.allow():
+    raise CircuitOpenError("Circuit breaker for {0} is open".format(host))
+
+  for attempt in range(retries + 1):
+    try:
+      response = session.request(method, url, **kwargs)
+      if response.status_code in RETRY_STATUSES:
+        response.raise_for_status()
+    except (requests.ConnectionError, requests.Timeout, requests.HTTPError):
+      if attempt == retries:
+        if breaker:
+          breaker.record_failure()
+        raise
+      # Full jitter keeps retries of parallel callers from lining up
+      time.sleep(random.uniform(0, backoff * (2 ** attempt)))
+      continue
+
+    if breaker:
+      breaker.record_success()
+    response.raise_for_status()
+    return response
+
+def get(url: str, **kwargs) -> requests.Response:
+  """Send a GET request, see `request`."""
+  return request("GET", url, **kwargs)
+
+def post(url: str, **kwargs) -> requests.Response:
+  """Send a POST request, see `request`."""
+  return request("POST", url, **kwargs)
+
+def _cache_path(cache_key: str) -> str:
+  return os.path.join(CACHE_DIR, hashlib.sha1(cache_key.encode("utf-8")).hexdigest() + ".json")
+
+def save_cached(cache_key: str, value):
+  """Store a JSON serializable value as the last known good value for `cache_key`."""
+  os.makedirs(CACHE_DIR, exist_ok=True)
+  path = _cache_path(cache_key)
+  with open(path + ".tmp", "w", encoding="utf-8") as f:
+    json.dump({"key": cache_key, "storedAt": time.time(), "value": value}, f)
+  os.replace(path + ".tmp", path)
+
+def load_cached(cache_key: str):
+  """
+  Load the last known good value stored for `cache_key`.
+
+  Returns:
+    tuple: (value, stored_at) or (None, None) if nothing is cached.
+  """
+  try:
+    with open(_cache_path(cache_key), "r", encoding="utf-8") as f:
+      cached = json.load(f)
+  except (OSError, ValueError):
+    return None, None
+  return cached["value"], cached["storedAt"]
+
+def with_fallback(cache_key: str, fetch):
+  """
+  Call `fetch` and cache its result, or return the cached result if it fails.
+
+  Stale data is preferred over failing the trade cycle, so any exception from `fetch`
+  (including an open circuit breaker) falls back to the last cached value.
+
+  Parameters:
+    cache_key (str): Key under which the result is cached.
+    fetch (callable): Function without arguments returning a JSON serializable value.
+
+  Returns:
+    The fresh value, or the cached value if `fetch` failed.
+
+  Raises:
+    Exception: The exception raised by `fetch` if nothing is cached yet.
+  """
+
+  try:
+    value = fetch()
+  except Exception as e:
+    cached, stored_at = load_cached(cache_key)
+    if stored_at is None:
+      raise
+    print("Using cached {0} from {1:.0f}s ago: {2}".format(cache_key, time.time() - stored_at, e))
+    return cached
+
+  save_cached(cache_key, value)
+  return value
+
+def get_json(url: str, cache_key: str = None, **kwargs):
+  """
+  GET a URL and parse the JSON response, falling back to the cached value on failure.
+
+  Parameters:
+    url (str): The URL to request.
+    cache_key (str): Key for the last known good value. No fallback is used if None.
+    **kwargs: Passed on to `request`.
+
+  Returns:
+    The parsed JSON response.
+  """
+
+  fetch = lambda: get(url, **kwargs).json()
+  if cache_key is None:
+    return fetch()
+  return with_fallback(cache_key, fetch)
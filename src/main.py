@@ -3,30 +3,101 @@ import upbit_integration as upbit
 import data_collection
 
 import db_integration as db
+import schemas
+import snapshots
+import rollup
+import notifications
+from deadline import Deadline, DeadlineExceeded
 
 import asyncio
+import datetime
 import json
 import os
 import time
-import requests
+from filelock import FileLock, Timeout
 
 from dotenv import load_dotenv
 load_dotenv()
 
-def main(test = False):
-  chart_data = data_collection.get_chart_data()
-  krw_balance = upbit.get_krw_balance()
-  btc_balance = upbit.get_btc_balance()
-  news_data = json.dumps(data_collection.collect_news())
-  past_trade_data = json.dumps(asyncio.run(db.get_past_trades(10)))
-  fear_greed_index = json.dumps(data_collection.get_fear_greed_index())
+notifier = notifications.from_env()
+
+# Held while a cycle runs, so overlapping runs (cron or scheduler) never read the same balances
+CYCLE_LOCK_PATH = os.getenv(
+  "CYCLE_LOCK_PATH",
+  os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "cycle.lock")
+)
+os.makedirs(os.path.dirname(CYCLE_LOCK_PATH), exist_ok=True)
+cycle_lock = FileLock(CYCLE_LOCK_PATH)
+
+# Seconds the optional inputs (chart, news, fear-greed index, past trades) may take before
+# their cached value is used instead
+OPTIONAL_STAGE_BUDGET = float(os.getenv("OPTIONAL_STAGE_BUDGET", "30"))
+
+# Recorded with the trade when the reflection fails or does not finish within the cycle budget
+REFLECTION_UNAVAILABLE = {
+  "reflection": "Not available",
+  "insights": {"successes": "Not available", "challenges": "Not available"},
+  "recommended_actions": "Not available",
+  "market_trends": "Not available",
+}
+
+def update_rollups():
+  """Update the performance rollup tables without failing the cycle."""
+  try:
+    asyncio.run(rollup.update_rollups())
+  except Exception as e:
+    print("Error updating performance rollups: {0}".format(e))
+
+def record_model_votes(trade_id: int, votes: list, timeout: float):
+  """Record the ensemble votes once slow members had up to `timeout` seconds to answer."""
+  if not votes:
+    return
+  ai.settle_votes(votes, timeout)
+  try:
+    asyncio.run(db.record_model_votes(trade_id, votes))
+  except Exception as e:
+    print("Error recording model votes: {0}".format(e))
+
+def cached_or_unavailable(value):
+  """Format a cached input for the prompt, or "Not available" if nothing is cached."""
+  return "Not available" if value is None else json.dumps(value)
+
+def main(test = False, deadline: Deadline = None):
+  deadline = deadline or Deadline()
+
+  # Collect the inputs in parallel. Only the balances are required: a slow or failing optional
+  # source falls back to its cached value, so it never costs the cycle.
+  collected = deadline.run_parallel(
+    {
+      "chart_data": data_collection.get_chart_data,
+      "krw_balance": upbit.get_krw_balance,
+      "btc_balance": upbit.get_btc_balance,
+      "news_data": lambda: json.dumps(data_collection.collect_news()),
+      "past_trade_data": lambda: json.dumps(asyncio.run(db.get_past_trades(10))),
+      "fear_greed_index": lambda: json.dumps(data_collection.get_fear_greed_index()),
+    },
+    fallbacks={
+      "chart_data": lambda: data_collection.load_cached_chart_data() or "Not available",
+      "news_data": lambda: cached_or_unavailable(data_collection.load_cached_news()),
+      "past_trade_data": lambda: "[]",
+      "fear_greed_index": lambda: cached_or_unavailable(data_collection.load_cached_fear_greed_index()),
+    },
+    optional_budget=OPTIONAL_STAGE_BUDGET
+  )
+  chart_data = collected["chart_data"]
+  krw_balance = collected["krw_balance"]
+  btc_balance = collected["btc_balance"]
+  news_data = collected["news_data"]
+  past_trade_data = collected["past_trade_data"]
+  fear_greed_index = collected["fear_greed_index"]
+  intraday_features = data_collection.load_intraday_features()
   try:
     trade_fee = float(os.getenv("TRADE_FEE"))
   except:
     raise Exception("Unexpected trade fee value in env variable")
   
-  # Get the trading decision from the AI
-  trade = ai.get_trade_decision(
+  # Get the trading decision from the AI, optionally from several models at once
+  decision_inputs = dict(
     chart_data=chart_data,
     past_trading_data=past_trade_data,
     current_krw_balance=krw_balance,
@@ -34,17 +105,41 @@ def main(test = False):
     news_data=news_data,
     fear_greed_index=fear_greed_index,
     trade_fee=trade_fee,
+    intraday_features=json.dumps(intraday_features) if intraday_features else "Not available",
   )
+  # The AI requests get the remaining budget as their timeout, so abandoned calls stop as well
+  if os.getenv("ENSEMBLE") == "true":
+    trade, votes = deadline.run(
+      "trade decision",
+      ai.get_ensemble_trade_decision,
+      deadline=min(90, deadline.remaining()),
+      timeout=deadline.request_timeout(),
+      **decision_inputs
+    )
+  else:
+    trade = deadline.run("trade decision", ai.get_trade_decision, timeout=deadline.request_timeout(), **decision_inputs)
+    votes = []
+
+  # Keep the amount within the balances and the minimum trade amount
+  trade = schemas.clamp_trade(trade, krw_balance, btc_balance, trade_fee)
+
+  # Past this point the trade is recorded and executed, so it is the last chance to give up
+  deadline.check("recording and executing the trade")
 
-  # Get the reflection from the AI
-  reflection = ai.get_reflection(
+  # Get the reflection from the AI. It is optional, so a slow or invalid reflection never
+  # throws away the decision.
+  reflection = deadline.run_optional(
+    "reflection",
+    lambda: REFLECTION_UNAVAILABLE,
+    ai.get_reflection,
     trade_data=json.dumps(trade),
     past_trade_data=past_trade_data,
-    current_market_data=chart_data
+    current_market_data=chart_data,
+    timeout=deadline.request_timeout()
   )
 
   # Record the trade in the database
-  asyncio.run(
+  new_trade = asyncio.run(
     db.record_trade(
       decision=trade["decision"],
       reason=trade["reason"],
@@ -56,9 +151,20 @@ def main(test = False):
       challenges=reflection["insights"]["challenges"]
     )
   )
+  # Keep every input of the decision so it can be replayed later
+  try:
+    manifest_hash = snapshots.save_snapshot({
+      **decision_inputs,
+      "prompt": ai.build_trade_decision_prompt(**decision_inputs),
+    })
+    asyncio.run(db.record_snapshot(new_trade.id, manifest_hash))
+  except Exception as e:
+    print("Error saving cycle snapshot: {0}".format(e))
 
   if test:
-    return
+    record_model_votes(new_trade.id, votes, min(30, deadline.remaining()))
+    update_rollups()
+    return new_trade
 
   # Execute the trade
   if trade["decision"] == "BUY":
@@ -70,24 +176,75 @@ def main(test = False):
 
   log = "{0}: {1} {2}KRW".format(time.time(), trade["decision"], trade["amount"])
 
-  try:
-    puuush_id = os.getenv("PUUUSH_ID")
-    url = "https://puuu.sh/notify/" + puuush_id
-    payload = {
-      "title": "AI-BITCOIN trade (TEST RUN)",
-      "body": log
-    }
-    requests.post(url, json=payload)
-  except:
-    print("Error sending notification.")
-  
+  # Notifications are sent in the background and never delay the cycle
+  notifier.notify("trade", log, decision=trade["decision"], amount=trade["amount"])
+
   print(log)
   print()
   print()
 
+  # Late ensemble members are recorded after the order, so they never delay it
+  record_model_votes(new_trade.id, votes, min(30, deadline.remaining()))
+  update_rollups()
+
+  return new_trade
+
+def run_cycle(
+  test = False,
+  deadline: Deadline = None,
+  scheduled_time: datetime.datetime = None,
+  missed_ticks: int = 0
+):
+  """
+  Run one bot cycle and record its measured duration and outcome as a cycle metric.
+
+  Exceptions raised by the cycle are reported as error notifications and re-raised.
+
+  Parameters:
+    test (bool): Record the trade without executing it.
+    deadline (Deadline): Time budget of the cycle, unlimited if not given.
+    scheduled_time (datetime): When the scheduler planned to start the cycle.
+    missed_ticks (int): Scheduled cycles skipped since the previous cycle.
+  """
+
+  started_time = datetime.datetime.now(datetime.timezone.utc)
+  started = time.monotonic()
+  deadline = deadline or Deadline()
+  new_trade = None
+  error = None
+  try:
+    new_trade = main(test=test, deadline=deadline)
+  except Exception as e:
+    error = e
+    notifier.notify("error", "Trade cycle failed: {0}".format(e))
+    raise
+  finally:
+    duration = time.monotonic() - started
+    notifier.notify("metrics", "Cycle finished in {0:.1f}s".format(duration), duration=duration)
+    try:
+      asyncio.run(
+        db.record_cycle_metric(
+          started_time=started_time,
+          duration=duration,
+          status="TIMEOUT" if isinstance(error, DeadlineExceeded) else "ERROR" if error else "OK",
+          error=str(error) if error else None,
+          trade_id=new_trade.id if new_trade else None,
+          budget=deadline.budget,
+          scheduled_time=scheduled_time,
+          missed_ticks=missed_ticks
+        )
+      )
+    except Exception as e:
+      print("Error recording cycle metric: {0}".format(e))
+
 if __name__ == "__main__":
   isTest = os.getenv("TEST")
-  if isTest == "true":
-    main(test=True)
-  else:
-    main()
\ No newline at end of file
+  budget = os.getenv("CYCLE_BUDGET")
+  try:
+    with cycle_lock.acquire(timeout=0):
+      run_cycle(test=isTest == "true", deadline=Deadline(float(budget) if budget else None))
+  except Timeout:
+    print("Another cycle is still running, skipping this run.")
+  finally:
+    # Give queued notifications a chance to go out before the process exits
+    notifier.close(timeout=15)
\ No newline at end of file
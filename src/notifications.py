@@ -0,0 +1,206 @@
+import os
+import queue
+import random
+import threading
+import time
+
+import http_client
+
+PUUUSH_URL = os.getenv("PUUUSH_URL", "https://puuu.sh/notify/")
+
+class Sink:
+  """
+  Destination for notification batches. Subclasses implement `send`, which receives a list of
+  events (dicts with kind, message, data and time keys) and raises on failure.
+  """
+
+  name = "sink"
+
+  def send(self, events: list):
+    raise NotImplementedError
+
+class PuuushSink(Sink):
+  """Sends each batch as a single Puuush push notification."""
+
+  name = "puuush"
+
+  def __init__(self, puuush_id: str, base_url: str = PUUUSH_URL):
+    self.url = base_url + puuush_id
+
+  def send(self, events: list):
+    if len(events) == 1:
+      title = "AI-BITCOIN {0}".format(events[0]["kind"])
+    else:
+      title = "AI-BITCOIN ({0} events)".format(len(events))
+    payload = {
+      "title": title,
+      "body": "\n".join(event["message"] for event in events)
+    }
+    # The dispatcher retries failed batches itself
+    http_client.post(self.url, json=payload, retries=0)
+
+class ConsoleSink(Sink):
+  """Prints notifications, useful when no push service is configured."""
+
+  name = "console"
+
+  def send(self, events: list):
+    for event in events:
+      print("[{0}] {1}".format(event["kind"], event["message"]))
+
+class NotificationDispatcher:
+  """
+  Queues notification events and delivers them to the sinks from a background thread.
+
+  `notify` never blocks the caller. The worker thread groups events into batches of up to
+  `batch_size` events, waiting at most `batch_interval` seconds for a batch to fill. Each sink
+  receives at most `rate_limit` batches per second, and a failed batch is retried up to
+  `retries` times with jittered backoff before it is dropped.
+  """
+
+  def __init__(
+    self,
+    sinks: list,
+    batch_size: int = 10,
+    batch_interval: float = 2.0,
+    rate_limit: float = 1.0,
+    retries: int = 3,
+    max_queue: int = 1000
+  ):
+    self.sinks = sinks
+    self.batch_size = batch_size
+    self.batch_interval = batch_interval
+    self.min_send_interval = 1 / rate_limit
+    self.retries = retries
+    self.queue = queue.Queue(maxsize=max_queue)
+    self.last_sent = {}
+    self.pending = 0
+    self.idle = threading.Condition()
+    self.stopped = False
+    self.thread = threading.Thread(target=self._run, name="notifications", daemon=True)
+    self.thread.start()
+
+  def notify(self, kind: str, message: str, **data):
+    """
+    Queue a notification event without waiting for it to be sent.
+
+    Parameters:
+      kind (str): The event kind, eg., trade, error, metrics.
+      message (str): Human readable text of the notification.
+      **data: Extra structured fields kept with the event.
+    """
+
+    if not self.sinks or self.stopped:
+      return
+    event = {"kind": kind, "message": message, "data": data, "time": time.time()}
+    with self.idle:
+      self.pending += 1
+    try:
+      self.queue.put_nowait(event)
+    except queue.Full:
+      print("Notification queue is full, dropping {0} event.".format(kind))
+      self._done(1)
+
+  def flush(self, timeout: float = None) -> bool:
+    """
+    Wait until every queued event has been delivered or dropped.
+
+    Returns:
+      bool: True if the queue drained before the timeout.
+    """
+
+    with self.idle:
+      return self.idle.wait_for(lambda: self.pending == 0, timeout)
+
+  def close(self, timeout: float = None) -> bool:
+    """Flush the queue and stop accepting new events."""
+
+    drained = self.flush(timeout)
+    self.stopped = True
+    return drained
+
+  def _done(self, count: int):
+    with self.idle:
+      self.pending -= count
+      self.idle.notify_all()
+
+  def _next_batch(self) -> list:
+    batch = [self.queue.get()]
+    deadline = time.monotonic() + self.batch_interval
+    while len(batch) < self.batch_size:
+      remaining = deadline - time.monotonic()
+      if remaining <= 0:
+        break
+      try:
+        batch.append(self.queue.get(timeout=remaining))
+      except queue.Empty:
+        break
+    return batch
+
+  def _send(self, sink: Sink, batch: list):
+    for attempt in range(self.retries + 1):
+      wait = self.last_sent.get(sink.name, 0) + self.min_send_interval - time.monotonic()
+      if wait > 0:
+        time.sleep(wait)
+      self.last_sent[sink.name] = time.monotonic()
+      try:
+        sink.send(batch)
+        return
+      except Exception as e:
+        if attempt == self.retries:
+          print("Error sending {0} notifications to {1}: {2}".format(len(batch), sink.name, e))
+          return
+        time.sleep(random.uniform(0, 0.5 * (2 ** attempt)))
+
+  def _run(self):
+    while True:
+      batch = self._next_batch()
+      for sink in self.sinks:
+        self._send(sink, batch)
+      self._done(len(batch))
+
+def from_env() -> NotificationDispatcher:
+  """
+  Create a dispatcher with the sinks configured in the environment.
+
+  PUUUSH_ID enables the Puuush sink, and PUUUSH_URL overrides its base URL (eg., to point it
+  at a local stand-in server). NOTIFY_CONSOLE=true additionally prints every notification.
+  """
+
+  sinks = []
+  puuush_id = os.getenv("PUUUSH_ID")
+  if puuush_id:
+    sinks.append(PuuushSink(puuush_id, os.getenv("PUUUSH_URL", PUUUSH_URL)))
+  if os.getenv("NOTIFY_CONSOLE") == "true":
+    sinks.append(ConsoleSink())
+  return NotificationDispatcher(sinks)
+
+if __name__ == "__main__":
+  # Send a few events to a local stand-in for the Puuush server
+  import json
+  from http.server import BaseHTTPRequestHandler, HTTPServer
+
+  class StandInHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+      body = self.rfile.read(int(self.headers["Content-Length"]))
+      print("{0} received {1}".format(self.path, json.loads(body)))
+      self.send_response(200)
+      self.end_headers()
+
+    def log_message(self, format, *args):
+      pass
+
+  server = HTTPServer(("127.0.0.1", 0), StandInHandler)
+  threading.Thread(target=server.serve_forever, daemon=True).start()
+
+  dispatcher = NotificationDispatcher(
+    [PuuushSink("local", "http://127.0.0.1:{0}/notify/".format(server.server_port))],
+    batch_interval=0.5
+  )
+  started = time.monotonic()
+  dispatcher.notify("trade", "BUY 10000KRW", decision="BUY", amount=10000)
+  dispatcher.notify("metrics", "Cycle finished in 42.0s", duration=42.0)
+  print("Queued in {0:.6f}s".format(time.monotonic() - started))
+  dispatcher.notify("error", "Something failed")
+  print("Drained:", dispatcher.close(timeout=10))
+  server.shutdown()
@@ -1,17 +1,83 @@
 from dotenv import load_dotenv
 from openai import OpenAI
-import json
+import time
+from concurrent.futures import (
+  ThreadPoolExecutor,
+  as_completed,
+  wait,
+  FIRST_COMPLETED,
+  TimeoutError as FuturesTimeoutError
+)
+from pydantic import ValidationError
 from prompts import (
   trade_decision_prompt_raw,
   reflection_prompt_raw,
   fill_prompt
 )
+from schemas import Decision, TradeDecision, Reflection
 
 load_dotenv()
 
 client = OpenAI()
 
-def get_trade_decision(
+TRADE_DECISION_SCHEMA = {
+  "type": "json_schema",
+  "json_schema": {
+    "name": "trade_decision",
+    "strict": True,
+    "schema": {
+      "type": "object",
+      "properties": {
+        "decision": {
+          "type": "string",
+          "enum": [decision.value for decision in Decision],
+          "description": "The decision being made, BUY, SELL or HOLD"
+        },
+        "reason": {
+          "type": "string",
+          "description": "The reason for the decision."
+        },
+        "amount": {
+          "type": "number",
+          "description": "The amout(KRW) you want to buy at the moment based on the data provided."
+        }
+      },
+      "required": [
+        "decision",
+        "reason",
+        "amount"
+      ],
+      "additionalProperties": False
+    }
+  }
+}
+
+# Cheaper and faster model used for the single retry after an invalid response
+FALLBACK_MODEL = {"model": "gpt-4o-mini", "reasoning_effort": None}
+
+# Models (and reasoning efforts) asked in parallel by the ensemble mode.
+# `weight` is how much a member's vote counts when the results are combined.
+ENSEMBLE_MEMBERS = [
+  {"model": "o3-mini", "reasoning_effort": "high", "weight": 2.0},
+  {"model": "o3-mini", "reasoning_effort": "medium", "weight": 1.5},
+  {"model": "o3-mini", "reasoning_effort": "low", "weight": 1.0},
+  {"model": "gpt-4o-mini", "reasoning_effort": None, "weight": 1.0},
+]
+
+def _expires(timeout: float = None):
+  return None if timeout is None else time.monotonic() + timeout
+
+def _time_left(expires: float = None):
+  return None if expires is None else max(expires - time.monotonic(), 0)
+
+def _client_with_timeout(timeout: float = None):
+  """The client, or a copy without retries whose requests give up after `timeout` seconds."""
+  if timeout is None:
+    return client
+  # The client retries twice by default, which would let a call run for three timeouts
+  return client.with_options(timeout=timeout, max_retries=0)
+
+def build_trade_decision_prompt(
   chart_data: str,
   past_trading_data: str,
   news_data: str,
@@ -19,36 +85,21 @@ def get_trade_decision(
   current_btc_balance: int,
   fear_greed_index: str,
   trade_fee: float,
+  intraday_features: str = "Not available",
+  template: str = trade_decision_prompt_raw,
 ):
   """
-  Get trading decision from AI based on provided market and account data.
-
-  This function formats a prompt using the provided chart data, past trading data,
-  news data, current KRW and BTC balances, as well as the current fear-greed index.
-  It then calls the AI completion API to obtain a trading decision and attempts
-  to parse the AI's response as JSON. If parsing fails, the function prints an error
-  message and recursively retries the decision-making process.
+  Fill the trade decision prompt template with the provided market and account data.
 
   Parameters:
-    chart_data (str): Chart data in string format.
-    past_trading_data (str): Past trading activity data.
-    news_data (str): Latest news data relevant to the trade decision.
-    current_krw_balance (int): Current balance of KRW.
-    current_btc_balance (int): Current balance of BTC.
-    fear_greed_index (str): Current fear-greed index as a string.
-    trade_fee (fload): Trade fee of 
+    template (str): The prompt template to fill, the default trade decision prompt if not given.
 
   Returns:
-    dict: The trading decision parsed from the AI response.
-
-  Notes:
-    In case of a JSON parsing error, the function recursively retries obtaining
-    a valid response.
+    str: The prompt text sent to the AI models.
   """
 
-  # Fill the blanks in prompt with the provided data
-  prompt = fill_prompt(
-    trade_decision_prompt_raw,
+  return fill_prompt(
+    template,
     CHART_DATA=chart_data,
     PAST_TRADING_DATA=past_trading_data,
     CURRENT_KRW_BALANCE=str(current_krw_balance),
@@ -56,11 +107,33 @@ def get_trade_decision(
     NEWS=news_data,
     FEAR_GREED_INDEX=fear_greed_index,
     TRADE_FEE=trade_fee,
+    INTRADAY_FEATURES=intraday_features,
   )
 
-  # Call the AI model to get a trading decision
-  response = client.chat.completions.create(
-    model="o3-mini",
+def request_trade_decision(prompt: str, model: str = "o3-mini", reasoning_effort: str = "high", timeout: float = None):
+  """
+  Send an already filled trade decision prompt to a single AI model.
+
+  Parameters:
+    prompt (str): The filled trade decision prompt.
+    model (str): The OpenAI model to call.
+    reasoning_effort (str or None): Reasoning effort for reasoning models, None for other models.
+    timeout (float): Seconds before the request is given up, without retries. The client
+      default (with retries) if None.
+
+  Returns:
+    dict: The trading decision parsed from the AI response and validated with `schemas.TradeDecision`.
+
+  Raises:
+    pydantic.ValidationError: If the response is not valid JSON or does not match the schema.
+  """
+
+  options = {}
+  if reasoning_effort is not None:
+    options["reasoning_effort"] = reasoning_effort
+
+  response = _client_with_timeout(timeout).chat.completions.create(
+    model=model,
     messages=[
       {
         "role": "user",
@@ -72,70 +145,289 @@ def get_trade_decision(
         ]
       }
     ],
-    response_format={
-      "type": "json_schema",
-      "json_schema": {
-        "name": "trade_decision",
-        "strict": True,
-        "schema": {
-          "type": "object",
-          "properties": {
-            "decision": {
-              "type": "string",
-              "description": "The decision being made, BUY, SELL or HOLD"
-            },
-            "reason": {
-              "type": "string",
-              "description": "The reason for the decision."
-            },
-            "amount": {
-              "type": "number",
-              "description": "The amout(KRW) you want to buy at the moment based on the data provided."
-            }
-          },
-          "required": [
-            "decision",
-            "reason",
-            "amount"
-          ],
-          "additionalProperties": False
-        }
-      }
-    },
-    reasoning_effort="high"
+    response_format=TRADE_DECISION_SCHEMA,
+    **options
   )
 
-  return json.loads(response.choices[0].message.content)
+  return TradeDecision.model_validate_json(response.choices[0].message.content).model_dump(mode="json")
+
+def get_trade_decision(
+  chart_data: str,
+  past_trading_data: str,
+  news_data: str,
+  current_krw_balance: int,
+  current_btc_balance: int,
+  fear_greed_index: str,
+  trade_fee: float,
+  intraday_features: str = "Not available",
+  timeout: float = None,
+):
+  """
+  Get trading decision from AI based on provided market and account data.
+
+  This function formats a prompt using the provided chart data, past trading data,
+  news data, current KRW and BTC balances, as well as the current fear-greed index.
+  It then calls the AI completion API to obtain a trading decision and validates
+  the AI's response against `schemas.TradeDecision`. If validation fails, the function
+  prints an error message and retries once with the faster `FALLBACK_MODEL`.
+
+  Parameters:
+    chart_data (str): Chart data in string format.
+    past_trading_data (str): Past trading activity data.
+    news_data (str): Latest news data relevant to the trade decision.
+    current_krw_balance (int): Current balance of KRW.
+    current_btc_balance (int): Current balance of BTC.
+    fear_greed_index (str): Current fear-greed index as a string.
+    trade_fee (fload): Trade fee of 
+    intraday_features (str): Latest intraday tick features as a JSON string.
+    timeout (float): Seconds the request and its retry may take together, unlimited if None.
+
+  Returns:
+    dict: The trading decision parsed from the AI response.
+
+  Raises:
+    pydantic.ValidationError: If the retry also returns an invalid response.
+  """
+
+  # Fill the blanks in prompt with the provided data
+  prompt = build_trade_decision_prompt(
+    chart_data=chart_data,
+    past_trading_data=past_trading_data,
+    news_data=news_data,
+    current_krw_balance=current_krw_balance,
+    current_btc_balance=current_btc_balance,
+    fear_greed_index=fear_greed_index,
+    trade_fee=trade_fee,
+    intraday_features=intraday_features,
+  )
+
+  # Call the AI model to get a trading decision
+  expires = _expires(timeout)
+  try:
+    return request_trade_decision(prompt, model="o3-mini", reasoning_effort="high", timeout=_time_left(expires))
+  except ValidationError as e:
+    print("Invalid trade decision, retrying with {0}: {1}".format(FALLBACK_MODEL["model"], e))
+    return request_trade_decision(prompt, **FALLBACK_MODEL, timeout=_time_left(expires))
+
+def _combine_votes(votes: list):
+  """
+  Combine finished ensemble votes into a single trading decision.
+
+  The decision with the highest total weight wins. The amount is the weight-averaged amount
+  of the members that voted for the winning decision, and the reason is taken from the
+  heaviest of those members.
+
+  Returns:
+    dict: The combined trading decision with decision, reason and amount keys.
+  """
+
+  totals = {}
+  for vote in votes:
+    totals[vote["decision"]] = totals.get(vote["decision"], 0) + vote["weight"]
+  decision = max(totals, key=totals.get)
+
+  agreeing = [vote for vote in votes if vote["decision"] == decision]
+  weight_sum = sum(vote["weight"] for vote in agreeing)
+  amount = sum(vote["amount"] * vote["weight"] for vote in agreeing) / weight_sum
+  reason = max(agreeing, key=lambda vote: vote["weight"])["reason"]
+
+  return {
+    "decision": decision,
+    "reason": reason,
+    "amount": int(round(amount)),
+  }
+
+def get_ensemble_trade_decision(
+  chart_data: str,
+  past_trading_data: str,
+  news_data: str,
+  current_krw_balance: int,
+  current_btc_balance: int,
+  fear_greed_index: str,
+  trade_fee: float,
+  intraday_features: str = "Not available",
+  members: list = None,
+  quorum: float = None,
+  deadline: float = 90,
+  timeout: float = None,
+):
+  """
+  Get a trading decision from several AI models asked in parallel.
+
+  The same prompt is sent to every ensemble member at once. Results are combined with a
+  weighted vote as they arrive, and the function returns early as soon as one decision has
+  collected `quorum` weight, or when `deadline` seconds have passed. If no member has answered
+  by the deadline, it waits for the first answer. Members that fail or are still running are
+  kept in the returned votes so their latency and agreement can be recorded: members still running
+  at the cutoff get status TIMEOUT, and are updated to LATE if they answer afterwards.
+
+  Parameters:
+    chart_data, past_trading_data, news_data, current_krw_balance, current_btc_balance,
+    fear_greed_index, trade_fee, intraday_features: Same as `get_trade_decision`.
+    members (list): Ensemble members as dicts with model, reasoning_effort and weight keys.
+      Defaults to `ENSEMBLE_MEMBERS`.
+    quorum (float): Vote weight needed to return early. Defaults to more than half of the total weight.
+    deadline (float): Seconds to wait before combining whatever votes have arrived.
+    timeout (float): Seconds after which every member request is given up, including late
+      members still answering after the cutoff. Unlimited if None.
+
+  Returns:
+    tuple: (trade, votes) where trade is the combined trading decision dict and votes is a list
+      of dicts with model, reasoning_effort, weight, decision, amount, latency, status and agreed keys.
+  """
+
+  members = members or ENSEMBLE_MEMBERS
+  if quorum is None:
+    quorum = sum(member["weight"] for member in members) / 2 + 1e-9
+
+  prompt = build_trade_decision_prompt(
+    chart_data=chart_data,
+    past_trading_data=past_trading_data,
+    news_data=news_data,
+    current_krw_balance=current_krw_balance,
+    current_btc_balance=current_btc_balance,
+    fear_greed_index=fear_greed_index,
+    trade_fee=trade_fee,
+    intraday_features=intraday_features,
+  )
+
+  expires = _expires(timeout)
+
+  def ask(member):
+    started = time.monotonic()
+    result = request_trade_decision(prompt, member["model"], member["reasoning_effort"], _time_left(expires))
+    return result, time.monotonic() - started
+
+  votes = [
+    {
+      "model": member["model"],
+      "reasoning_effort": member["reasoning_effort"],
+      "weight": member["weight"],
+      "decision": None,
+      "reason": None,
+      "amount": None,
+      "latency": None,
+      "status": "PENDING",
+      "agreed": None,
+    }
+    for member in members
+  ]
+
+  executor = ThreadPoolExecutor(max_workers=len(members))
+  futures = {executor.submit(ask, member): vote for member, vote in zip(members, votes)}
+  started = time.monotonic()
+  totals = {}
+
+  def collect(future):
+    vote = futures[future]
+    if not _fill_vote(vote, future, started, "OK"):
+      return False
+    totals[vote["decision"]] = totals.get(vote["decision"], 0) + vote["weight"]
+    return totals[vote["decision"]] >= quorum
+
+  try:
+    for future in as_completed(futures, timeout=deadline):
+      if collect(future):
+        break
+  except FuturesTimeoutError:
+    pass
+
+  # Nothing usable before the deadline, so fall back to the first member that answers
+  while not totals and any(vote["status"] == "PENDING" for vote in votes):
+    pending = [future for future, vote in futures.items() if vote["status"] == "PENDING"]
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    for future in done:
+      collect(future)
+
+  # Members that answered while the votes above were counted were still in time
+  for future, vote in futures.items():
+    if vote["status"] == "PENDING" and future.done():
+      collect(future)
+
+  executor.shutdown(wait=False, cancel_futures=True)
+  cutoff = time.monotonic() - started
+  print("Ensemble finished in {0:.1f}s".format(cutoff))
+
+  finished = [vote for vote in votes if vote["status"] == "OK"]
+  if not finished:
+    raise Exception("No ensemble member returned a trade decision")
+
+  trade = _combine_votes(finished)
+  for vote in finished:
+    vote["agreed"] = vote["decision"] == trade["decision"]
+
+  # Members still running at the cutoff keep the elapsed time as a lower bound of their latency,
+  # and fill in their real latency and decision if they answer later (see `settle_votes`)
+  for future, vote in futures.items():
+    if vote["status"] == "PENDING":
+      vote.update(status="TIMEOUT", latency=cutoff, future=future, started=started, combined=trade["decision"])
+
+  return trade, votes
+
+def _fill_vote(vote: dict, future, started: float, status: str) -> bool:
+  """Fill a vote from the finished future of its member. Returns False if the member failed."""
+  try:
+    result, latency = future.result()
+  except Exception as e:
+    print("Ensemble member {0} ({1}) failed: {2}".format(vote["model"], vote["reasoning_effort"], e))
+    vote.update(status="ERROR", latency=time.monotonic() - started)
+    return False
+  vote.update(
+    decision=str(result["decision"]).upper(),
+    reason=result["reason"],
+    amount=result["amount"],
+    latency=latency,
+    status=status,
+  )
+  return True
+
+def settle_votes(votes: list, timeout: float):
+  """
+  Wait up to `timeout` seconds for ensemble members that were still running at the cutoff.
+
+  Members that answer in time get status LATE with their real latency and agreement. The
+  others keep status TIMEOUT with the time elapsed at the cutoff.
+  """
+
+  pending = [vote for vote in votes if vote.get("future") is not None]
+  if pending:
+    wait([vote["future"] for vote in pending], timeout=max(timeout, 0))
+  for vote in pending:
+    future = vote.pop("future")
+    started = vote.pop("started")
+    combined = vote.pop("combined")
+    if future.done() and _fill_vote(vote, future, started, "LATE"):
+      vote["agreed"] = vote["decision"] == combined
 
 
 def get_reflection(
   trade_data: str,
   past_trade_data: str,
-  current_market_data: str
+  current_market_data: str,
+  timeout: float = None
 ):
   """
   Generate a reflection by processing trading and market data through an AI model.
 
   This function builds a prompt using the provided current trading data, past trading data,
   and current market data. It then sends this prompt to an AI chat model and retrieves a response.
-  The response is parsed as JSON and returned as a Python object.
+  The response is validated against `schemas.Reflection` and returned as a dictionary.
 
   Parameters:
     trade_data (str): A string containing the current trading data.
     past_trade_data (str): A string containing historical trading data.
     current_market_data (str): A string detailing the current market conditions.
+    timeout (float): Seconds the request and its retry may take together, unlimited if None.
 
   Returns:
-    object: The parsed JSON response from the AI, typically a dictionary or list based on the content.
+    dict: The validated reflection with reflection, insights, recommended_actions and market_trends keys.
 
   Behavior:
-    If the response cannot be parsed as valid JSON, the function prints an error message and
-    recursively calls itself to attempt generating a valid reflection.
+    If the response is not valid JSON or does not match the schema, the function prints an error
+    message and asks the model once more.
 
-  Note:
-    This function assumes that the helper functions `fill_prompt` and `parse_response`, the 
-    variable `reflection_prompt_raw`, and the `client` for the AI model API are defined and 
-    available in the module's context.
+  Raises:
+    pydantic.ValidationError: If the retry also returns an invalid response.
   """
 
   # Fill the blanks in prompt with the provided data
@@ -146,75 +438,83 @@ def get_reflection(
     CURRENT_MARKET_DATA=current_market_data
   )
 
-  # Call the AI model to get a reflection
-  response = client.chat.completions.create(
-    model="gpt-4o-mini",
-    messages=[
-      {
-        "role": "user",
-        "content": [
-          {
-            "type": "text",
-            "text": prompt
-          }
-        ]
-      }
-    ],
-    response_format={
-      "type": "json_schema",
-      "json_schema": {
-        "name": "trading_assistant_analysis",
-        "strict": True,
-        "schema": {
-          "type": "object",
-          "properties": {
-            "reflection": {
-              "type": "string",
-              "description": "A brief reflection on the recent trading decisions."
-            },
-            "insights": {
-              "type": "object",
-              "description": "Insights on what worked well and what didn't.",
-              "properties": {
-                "successes": {
-                  "type": "string",
-                  "description": "Insights on what worked well."
+  # Call the AI model to get a reflection, asking once more if the response is invalid
+  expires = _expires(timeout)
+  for attempt in range(2):
+    response = _client_with_timeout(_time_left(expires)).chat.completions.create(
+      model="gpt-4o-mini",
+      messages=[
+        {
+          "role": "user",
+          "content": [
+            {
+              "type": "text",
+              "text": prompt
+            }
+          ]
+        }
+      ],
+      response_format={
+        "type": "json_schema",
+        "json_schema": {
+          "name": "trading_assistant_analysis",
+          "strict": True,
+          "schema": {
+            "type": "object",
+            "properties": {
+              "reflection": {
+                "type": "string",
+                "description": "A brief reflection on the recent trading decisions."
+              },
+              "insights": {
+                "type": "object",
+                "description": "Insights on what worked well and what didn't.",
+                "properties": {
+                  "successes": {
+                    "type": "string",
+                    "description": "Insights on what worked well."
+                  },
+                  "challenges": {
+                    "type": "string",
+                    "description": "Insights on what didn't work well."
+                  }
                 },
-                "challenges": {
-                  "type": "string",
-                  "description": "Insights on what didn't work well."
-                }
+                "required": [
+                  "successes",
+                  "challenges"
+                ],
+                "additionalProperties": False
               },
-              "required": [
-                "successes",
-                "challenges"
-              ],
-              "additionalProperties": False
-            },
-            "recommended_actions": {
-              "type": "string",
-              "description": "Suggestions for improvement in future trading decisions."
+              "recommended_actions": {
+                "type": "string",
+                "description": "Suggestions for improvement in future trading decisions."
+              },
+              "market_trends": {
+                "type": "string",
+                "description": "Any patterns of trends you notice in the market data."
+              }
             },
-            "market_trends": {
-              "type": "string",
-              "description": "Any patterns of trends you notice in the market data."
-            }
-          },
-          "required": [
-            "reflection",
-            "insights",
-            "recommended_actions",
-            "market_trends"
-          ],
-          "additionalProperties": False
+            "required": [
+              "reflection",
+              "insights",
+              "recommended_actions",
+              "market_trends"
+            ],
+            "additionalProperties": False
+          }
         }
-      }
-    },
-    temperature=1,
-    max_completion_tokens=10000,
-    top_p=1,
-    frequency_penalty=0,
-    presence_penalty=0
-  )
+      },
+      temperature=1,
+      max_completion_tokens=10000,
+      top_p=1,
+      frequency_penalty=0,
+      presence_penalty=0
+    )
+
+    try:
+      return Reflection.model_validate_json(response.choices[0].message.content).model_dump()
+    except ValidationError as e:
+      if attempt == 1:
+        raise
+      print("Invalid reflection, retrying: {0}".format(e))
 
-  return json.loads(response.choices[0].message.content)
@@ -7,6 +7,17 @@ def _read_file(filename: str) -> str:
   with open(os.path.join(PROMPTS_DIR, filename), 'r', encoding='utf-8') as f:
     return f.read()
 
+def load_prompt(filename: str) -> str:
+  """Read the raw text of a prompt file in the prompts directory."""
+  return _read_file(filename)
+
+def list_prompts(prefix: str = "") -> list:
+  """List the prompt files whose name starts with `prefix`, eg., trade_decision variants."""
+  return sorted(
+    filename for filename in os.listdir(PROMPTS_DIR)
+    if filename.startswith(prefix) and filename.endswith(".txt")
+  )
+
 # Load the raw text of each prompt
 trade_decision_prompt_raw = _read_file('trade_decision.txt')
 reflection_prompt_raw = _read_file('reflection.txt')
@@ -38,4 +49,6 @@ __all__ = [
   "trade_decision_prompt_raw",
   "reflection_prompt_raw",
   "fill_prompt",
+  "load_prompt",
+  "list_prompts",
 ]
\ No newline at end of file
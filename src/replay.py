@@ -0,0 +1,108 @@
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import openai_integration as ai
+import db_integration as db
+import schemas
+import snapshots
+
+def replay_cycle(snapshot: dict, model: str, reasoning_effort: str, rebuild_prompt: bool = False) -> dict:
+  """
+  Re-run the trade decision of one recorded cycle from its stored inputs.
+
+  Only the AI model is called; market data, balances and news all come from the snapshot,
+  and no order is placed.
+
+  Parameters:
+    snapshot (dict): A snapshot as returned by `db_integration.get_snapshots`.
+    model (str): The model to ask.
+    reasoning_effort (str or None): Reasoning effort for reasoning models.
+    rebuild_prompt (bool): Fill the current prompt template with the stored inputs instead of
+      sending the stored prompt text.
+
+  Returns:
+    dict: The recorded and replayed decisions and amounts, and the replay latency.
+  """
+
+  inputs = snapshots.load_snapshot(snapshot["manifestHash"])
+  prompt = inputs.pop("prompt")
+  if rebuild_prompt:
+    prompt = ai.build_trade_decision_prompt(**inputs)
+
+  started = time.monotonic()
+  try:
+    trade = ai.request_trade_decision(prompt, model, reasoning_effort)
+    trade = schemas.clamp_trade(
+      trade,
+      inputs["current_krw_balance"],
+      inputs["current_btc_balance"],
+      inputs["trade_fee"]
+    )
+    error = None
+  except Exception as e:
+    trade = {"decision": None, "amount": None}
+    error = str(e)
+
+  return {
+    "tradeId": snapshot["tradeId"],
+    "recordedDecision": snapshot["decision"],
+    "recordedAmount": snapshot["amount"],
+    "replayedDecision": trade["decision"],
+    "replayedAmount": trade["amount"],
+    "latency": time.monotonic() - started,
+    "error": error,
+  }
+
+def replay(
+  first_trade_id: int = None,
+  last_trade_id: int = None,
+  model: str = "o3-mini",
+  reasoning_effort: str = "high",
+  rebuild_prompt: bool = False,
+  workers: int = 8
+) -> list:
+  """
+  Replay every recorded cycle in a trade id range, running `workers` cycles in parallel.
+
+  Returns:
+    list: The results of `replay_cycle`, in trade id order.
+  """
+
+  cycles = asyncio.run(db.get_snapshots(first_trade_id, last_trade_id))
+  with ThreadPoolExecutor(max_workers=workers) as executor:
+    return list(executor.map(
+      lambda snapshot: replay_cycle(snapshot, model, reasoning_effort, rebuild_prompt),
+      cycles
+    ))
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Replay recorded trade decisions from their input snapshots.")
+  parser.add_argument("--from", dest="first", type=int, help="First trade id to replay")
+  parser.add_argument("--to", dest="last", type=int, help="Last trade id to replay")
+  parser.add_argument("--model", default="o3-mini")
+  parser.add_argument("--reasoning-effort", default="high", help='Use "none" for non-reasoning models')
+  parser.add_argument("--rebuild-prompt", action="store_true", help="Use the current prompt template")
+  parser.add_argument("--workers", type=int, default=8)
+  args = parser.parse_args()
+
+  started = time.monotonic()
+  results = replay(
+    args.first,
+    args.last,
+    args.model,
+    None if args.reasoning_effort == "none" else args.reasoning_effort,
+    args.rebuild_prompt,
+    args.workers
+  )
+
+  for result in results:
+    print("#{tradeId}: recorded {recordedDecision} {recordedAmount}KRW, replayed {replayedDecision} {replayedAmount}KRW ({latency:.1f}s){0}".format(
+      " error: " + result["error"] if result["error"] else "", **result
+    ))
+  if results:
+    agreed = sum(result["replayedDecision"] == result["recordedDecision"] for result in results)
+    print("Replayed {0} cycles in {1:.1f}s, {2} ({3:.0%}) matched the recorded decision".format(
+      len(results), time.monotonic() - started, agreed, agreed / len(results)
+    ))
@@ -0,0 +1,189 @@
+import asyncio
+import bisect
+import datetime
+import os
+import pyupbit
+from dotenv import load_dotenv
+from prisma import Prisma
+
+load_dotenv()
+
+# Rollup period -> (pyupbit candle interval, bucket length)
+PERIODS = {
+  "day": ("day", datetime.timedelta(days=1)),
+  "hour": ("minute60", datetime.timedelta(hours=1)),
+}
+
+def floor_bucket(time: datetime.datetime, period: str) -> datetime.datetime:
+  """Return the UTC start of the day or hour bucket containing `time`."""
+  time = time.astimezone(datetime.timezone.utc)
+  if period == "day":
+    return time.replace(hour=0, minute=0, second=0, microsecond=0)
+  return time.replace(minute=0, second=0, microsecond=0)
+
+def get_close_prices(period: str, start: datetime.datetime) -> dict:
+  """
+  Fetch KRW-BTC close prices for every bucket from `start` until now.
+
+  Upbit candles are indexed in KST, so the index is converted to UTC bucket starts. Daily
+  candles start at 09:00 KST, which is midnight UTC.
+
+  Returns:
+    dict: Close price keyed by UTC bucket start.
+  """
+
+  interval, step = PERIODS[period]
+  now_bucket = floor_bucket(datetime.datetime.now(datetime.timezone.utc), period)
+  count = int((now_bucket - start) / step) + 1
+  df = pyupbit.get_ohlcv("KRW-BTC", interval=interval, count=count)
+  if df is None:
+    raise Exception("Failed to fetch market data from pyupbit")
+
+  index = df.index.tz_localize("Asia/Seoul").tz_convert("UTC")
+  return {
+    floor_bucket(time.to_pydatetime(), period): float(close)
+    for time, close in zip(index, df["close"])
+  }
+
+def _empty_row() -> dict:
+  return {
+    "buyCount": 0,
+    "sellCount": 0,
+    "holdCount": 0,
+    "buyVolume": 0.0,
+    "sellVolume": 0.0,
+    "realizedPnl": 0.0,
+  }
+
+async def _update_period(prisma: Prisma, period: str, trade_fee: float) -> int:
+  state = await prisma.rollupstate.find_unique(where={"period": period})
+  last_trade_id = state.lastTradeId if state else 0
+
+  trades = await prisma.trade.find_many(
+    where={"id": {"gt": last_trade_id}},
+    order={"id": "asc"}
+  )
+  if state is None and not trades:
+    return 0
+
+  # The last bucket of the previous run may still be open, so it is updated again
+  start = state.lastBucket if state else floor_bucket(trades[0].tradedTime, period)
+  prices = get_close_prices(period, start)
+  buckets = sorted(bucket for bucket in prices if bucket >= start)
+  if not buckets:
+    return 0
+
+  position = state.btcPosition if state else 0.0
+  cost_basis = state.costBasis if state else 0.0
+  realized_pnl = state.realizedPnl if state else 0.0
+  first_price = state.firstPrice if state else prices[buckets[0]]
+
+  # Trades in a bucket without a candle are counted in the next available one
+  trades_by_bucket = {}
+  for trade in trades:
+    i = min(bisect.bisect_left(buckets, floor_bucket(trade.tradedTime, period)), len(buckets) - 1)
+    trades_by_bucket.setdefault(buckets[i], []).append(trade)
+
+  first_row = _empty_row()
+  if state:
+    existing = await prisma.performancerollup.find_unique(
+      where={"period_bucket": {"period": period, "bucket": start}}
+    )
+    if existing:
+      first_row = {key: getattr(existing, key) for key in first_row}
+
+  rows = []
+  for bucket in buckets:
+    price = prices[bucket]
+    row = first_row if bucket == start else _empty_row()
+
+    for trade in trades_by_bucket.get(bucket, []):
+      decision = trade.decision.upper()
+      if decision == "BUY":
+        row["buyCount"] += 1
+        row["buyVolume"] += trade.amount
+        position += trade.amount * (1 - trade_fee) / price
+        cost_basis += trade.amount
+      elif decision == "SELL":
+        row["sellCount"] += 1
+        row["sellVolume"] += trade.amount
+        sold = min(trade.amount / price, position)
+        if sold > 0:
+          # Realize profit against the average cost of the open position
+          sold_cost = cost_basis * sold / position
+          pnl = sold * price * (1 - trade_fee) - sold_cost
+          row["realizedPnl"] += pnl
+          realized_pnl += pnl
+          cost_basis -= sold_cost
+          position -= sold
+      else:
+        row["holdCount"] += 1
+
+    row.update(
+      krwVolume=row["buyVolume"] + row["sellVolume"],
+      totalPnl=realized_pnl + position * price - cost_basis,
+      closePrice=price,
+      marketReturn=(price - first_price) / first_price * 100,
+    )
+    rows.append((bucket, row))
+
+  async with prisma.batch_() as batcher:
+    for bucket, row in rows:
+      batcher.performancerollup.upsert(
+        where={"period_bucket": {"period": period, "bucket": bucket}},
+        data={
+          "create": {"period": period, "bucket": bucket, **row},
+          "update": row
+        }
+      )
+    state_data = {
+      "lastTradeId": trades[-1].id if trades else last_trade_id,
+      "lastBucket": buckets[-1],
+      "btcPosition": position,
+      "costBasis": cost_basis,
+      "realizedPnl": realized_pnl,
+      "firstPrice": first_price,
+    }
+    batcher.rollupstate.upsert(
+      where={"period": period},
+      data={
+        "create": {"period": period, **state_data},
+        "update": state_data
+      }
+    )
+
+  return len(rows)
+
+async def update_rollups(periods=("day", "hour")):
+  """
+  Incrementally update the daily and hourly performance rollup tables.
+
+  Only trades recorded since the previous run are processed. Their decisions and KRW volume
+  are added to the bucket they were traded in, and the running BTC position is carried in the
+  RollupState table so realized profit (average cost) and total profit can be updated without
+  reading older trades again. Buckets without trades still get a row, so total profit and
+  market return follow the price.
+
+  Parameters:
+    periods (tuple): Rollup periods to update, "day" and/or "hour".
+
+  Returns:
+    int: The number of rollup rows written.
+  """
+
+  trade_fee = float(os.getenv("TRADE_FEE", "0")) / 100
+
+  prisma = Prisma()
+  await prisma.connect()
+
+  try:
+    updated = 0
+    for period in periods:
+      updated += await _update_period(prisma, period, trade_fee)
+  finally:
+    await prisma.disconnect()
+
+  return updated
+
+if __name__ == "__main__":
+  print("Updated {0} rollup rows".format(asyncio.run(update_rollups())))
@@ -0,0 +1,111 @@
+import argparse
+import asyncio
+import datetime
+import math
+import os
+import time
+from filelock import Timeout
+
+import main
+import db_integration as db
+from deadline import Deadline
+
+def _record_skipped(scheduled_time: datetime.datetime, missed_ticks: int, reason: str):
+  try:
+    asyncio.run(
+      db.record_cycle_metric(
+        started_time=datetime.datetime.now(datetime.timezone.utc),
+        duration=0,
+        status="SKIPPED",
+        error=reason,
+        scheduled_time=scheduled_time,
+        missed_ticks=missed_ticks
+      )
+    )
+  except Exception as e:
+    print("Error recording cycle metric: {0}".format(e))
+
+def next_tick_after_cycle(scheduled: float, finished: float, interval: float, catch_up: bool):
+  """
+  Decide when to run next after a cycle that was scheduled at `scheduled` ended at `finished`.
+
+  If the cycle ran past one or more following ticks, those ticks were missed. With `catch_up`
+  the missed ticks are coalesced into a single cycle that starts right away; without it the
+  scheduler waits for the next tick that is still in the future.
+
+  Returns:
+    tuple: (next_tick, missed_ticks) with next_tick as epoch seconds and missed_ticks the number
+      of ticks that will not get their own cycle.
+  """
+
+  overdue = int((finished - scheduled) // interval)
+  if overdue < 1:
+    return scheduled + interval, 0
+  if catch_up:
+    # The latest overdue tick is already due, so it runs right away and keeps the schedule aligned
+    return scheduled + overdue * interval, overdue - 1
+  return scheduled + (overdue + 1) * interval, overdue
+
+def run_scheduler(interval: float, budget: float = None, catch_up: bool = True, test: bool = False):
+  """
+  Run bot cycles every `interval` seconds, aligned to multiples of the interval.
+
+  Every cycle holds the same file lock as `python src/main.py`, so a cycle never overlaps
+  another one started by this scheduler, a second scheduler or cron. A tick that finds the lock
+  held is skipped. Each cycle gets a time budget (80% of the interval by default) after which
+  slow stages are abandoned before any order is placed. Cycles that overrun the following ticks
+  are handled by `next_tick_after_cycle`. The duration, budget, scheduled time and missed ticks
+  of every cycle are recorded as cycle metrics.
+
+  Parameters:
+    interval (float): Seconds between cycles.
+    budget (float): Seconds each cycle may take.
+    catch_up (bool): Run one cycle right away after an overrun instead of waiting for the next tick.
+    test (bool): Record trades without executing them.
+  """
+
+  budget = budget or interval * 0.8
+  next_tick = math.ceil(time.time() / interval) * interval
+  missed_ticks = 0
+  print("Running a cycle every {0:.0f}s with a budget of {1:.0f}s".format(interval, budget))
+
+  while True:
+    time.sleep(max(next_tick - time.time(), 0))
+    scheduled = next_tick
+    scheduled_time = datetime.datetime.fromtimestamp(scheduled, datetime.timezone.utc)
+
+    try:
+      with main.cycle_lock.acquire(timeout=0):
+        main.run_cycle(
+          test=test,
+          deadline=Deadline(budget),
+          scheduled_time=scheduled_time,
+          missed_ticks=missed_ticks
+        )
+    except Timeout:
+      print("Another cycle is still running, skipping the tick at {0}".format(scheduled_time.isoformat()))
+      _record_skipped(scheduled_time, missed_ticks, "Cycle lock held by another run")
+    except Exception as e:
+      # run_cycle already notified and recorded the failure
+      print("Cycle failed: {0}".format(e))
+
+    next_tick, missed_ticks = next_tick_after_cycle(scheduled, time.time(), interval, catch_up)
+    if missed_ticks:
+      print("Cycle overran the schedule, {0} tick(s) missed".format(missed_ticks))
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Run the trading bot on a fixed schedule.")
+  parser.add_argument("--interval", type=float, default=float(os.getenv("CYCLE_INTERVAL", "3600")), help="Seconds between cycles")
+  parser.add_argument("--budget", type=float, default=float(os.getenv("CYCLE_BUDGET", "0")) or None, help="Seconds each cycle may take")
+  parser.add_argument("--no-catch-up", action="store_true", help="Wait for the next tick after an overrun")
+  args = parser.parse_args()
+
+  try:
+    run_scheduler(
+      args.interval,
+      args.budget,
+      catch_up=not args.no_catch_up,
+      test=os.getenv("TEST") == "true"
+    )
+  finally:
+    main.notifier.close(timeout=15)
@@ -0,0 +1,78 @@
+from enum import Enum
+from pydantic import BaseModel, Field, field_validator
+
+# Upbit's minimum order size, after transaction fees
+MIN_TRADE_KRW = 5000
+
+class Decision(str, Enum):
+  BUY = "BUY"
+  SELL = "SELL"
+  HOLD = "HOLD"
+
+class TradeDecision(BaseModel):
+  """A trading decision returned by the AI."""
+
+  decision: Decision
+  reason: str
+  amount: float = Field(ge=0)
+
+  @field_validator("decision", mode="before")
+  @classmethod
+  def normalize_decision(cls, value):
+    return value.strip().upper() if isinstance(value, str) else value
+
+class Insights(BaseModel):
+  successes: str
+  challenges: str
+
+class Reflection(BaseModel):
+  """A reflection on recent trades returned by the AI."""
+
+  reflection: str
+  insights: Insights
+  recommended_actions: str
+  market_trends: str
+
+def clamp_trade(trade: dict, krw_balance: float, btc_balance: float, trade_fee: float) -> dict:
+  """
+  Make a validated trading decision executable with the current balances.
+
+  BUY amounts are capped at the KRW balance and SELL amounts at the KRW value of the BTC
+  balance. A trade that would fall below the minimum order size after fees is turned into
+  a HOLD, and HOLD decisions always have an amount of 0.
+
+  Parameters:
+    trade (dict): The trading decision with decision, reason and amount keys.
+    krw_balance (float): Current balance of KRW.
+    btc_balance (float): Current value of the BTC balance in KRW.
+    trade_fee (float): Trade fee in percent.
+
+  Returns:
+    dict: A new trading decision with an executable amount (int).
+  """
+
+  decision = trade["decision"]
+  reason = trade["reason"]
+  amount = trade["amount"]
+
+  if decision == Decision.BUY:
+    amount = min(amount, krw_balance)
+  elif decision == Decision.SELL:
+    amount = min(amount, btc_balance)
+  else:
+    amount = 0
+  # Check the minimum on the whole KRW amount that is actually executed
+  amount = int(amount)
+
+  if decision != Decision.HOLD and amount * (1 - trade_fee / 100) < MIN_TRADE_KRW:
+    reason = "{0} (Changed from {1} to HOLD: {2}KRW is below the minimum trade amount or balance.)".format(
+      reason, Decision(decision).value, amount
+    )
+    decision = Decision.HOLD
+    amount = 0
+
+  return {
+    "decision": Decision(decision).value,
+    "reason": reason,
+    "amount": amount,
+  }
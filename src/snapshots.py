@@ -0,0 +1,63 @@
+import hashlib
+import json
+import os
+import zlib
+
+SNAPSHOT_DIR = os.getenv(
+  "SNAPSHOT_DIR",
+  os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "snapshots")
+)
+
+def _blob_path(blob_hash: str) -> str:
+  return os.path.join(SNAPSHOT_DIR, blob_hash[:2], blob_hash + ".zlib")
+
+def put_blob(data: bytes) -> str:
+  """
+  Store compressed bytes under their SHA-256 hash. Identical data is only stored once.
+
+  Returns:
+    str: The hex SHA-256 hash of the uncompressed data.
+  """
+
+  blob_hash = hashlib.sha256(data).hexdigest()
+  path = _blob_path(blob_hash)
+  if not os.path.exists(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "wb") as f:
+      f.write(zlib.compress(data, 6))
+    os.replace(path + ".tmp", path)
+  return blob_hash
+
+def get_blob(blob_hash: str) -> bytes:
+  """Load and decompress the bytes stored under `blob_hash`."""
+  with open(_blob_path(blob_hash), "rb") as f:
+    return zlib.decompress(f.read())
+
+def save_snapshot(inputs: dict) -> str:
+  """
+  Store the inputs of a cycle.
+
+  Every input is stored as its own JSON blob, so inputs that did not change between cycles
+  (eg., news or the fear-greed index) are shared. A manifest blob maps input names to blob
+  hashes and identifies the whole snapshot.
+
+  Parameters:
+    inputs (dict): JSON serializable inputs keyed by name.
+
+  Returns:
+    str: The hash of the manifest blob.
+  """
+
+  manifest = {
+    name: put_blob(json.dumps(value).encode("utf-8"))
+    for name, value in inputs.items()
+  }
+  return put_blob(json.dumps(manifest, sort_keys=True).encode("utf-8"))
+
+def load_snapshot(manifest_hash: str) -> dict:
+  """Load the inputs stored by `save_snapshot`."""
+  manifest = json.loads(get_blob(manifest_hash))
+  return {
+    name: json.loads(get_blob(blob_hash))
+    for name, blob_hash in manifest.items()
+  }
@@ -1,21 +1,23 @@
 import streamlit as st
 import pandas as pd
 import asyncio
-import datetime
-import pyupbit
 from prisma import Client
 
 # Initialize Prisma client
 client = Client()
 
+# Number of most recent rows shown in the raw data tabs
+RECENT_ROWS = 200
+
 # Async function to load data using Prisma
 async def load_data():
   await client.connect()
-  trades = await client.trade.find_many()
-  reflections = await client.reflection.find_many()
-  insights = await client.insights.find_many()
+  trades = await client.trade.find_many(take=RECENT_ROWS, order={"tradedTime": "desc"})
+  reflections = await client.reflection.find_many(take=RECENT_ROWS, order={"id": "desc"})
+  insights = await client.insights.find_many(take=RECENT_ROWS, order={"id": "desc"})
+  rollups = await client.performancerollup.find_many(where={"period": "day"}, order={"bucket": "asc"})
   await client.disconnect()
-  return trades, reflections, insights
+  return trades, reflections, insights, rollups
 
 def convert_to_dataframe(data, columns):
   """Converts a list of Prisma objects to a DataFrame using specified columns."""
@@ -27,70 +29,15 @@ def convert_to_dataframe(data, columns):
     rows.append(row)
   return pd.DataFrame(rows)
 
-def get_market_data(start_date):
-  """Fetch daily OHLCV data from pyupbit starting from start_date until today."""
-  today = datetime.date.today()
-  days = (today - start_date).days + 1
-  df = pyupbit.get_ohlcv("KRW-BTC", interval="day", count=days)
-  if df is None:
-    st.error("Failed to fetch market data from pyupbit")
-    st.stop()
-  # Convert index to plain date objects for easy lookup
-  df.index = df.index.date
-  return df
-
-def get_price_at_date(trade_date, market_df):
-  """Return the closing price for a trade date from the market dataframe."""
-  date_key = trade_date.date()
-  try:
-    price = market_df.loc[date_key, "close"]
-    return price
-  except Exception:
-    return None
-
-def compute_strategy_return(trades_df, market_df):
+def compute_strategy_return(rollups_df):
   """
-  Computes the strategy return.
-  - For each BUY: add (price * amount) to total cost and increase net position.
-  - For each SELL: add (price * amount) to total revenue and decrease net position.
-  If there is an open (unclosed) position, its value is added at the latest market price.
+  Computes the strategy return from the daily rollups: the latest total profit (realized and
+  unrealized) relative to the total KRW spent on buys.
   """
-  trades_df_sorted = trades_df.sort_values(by="tradedTime")
-  total_buy_cost = 0.0
-  total_sell_revenue = 0.0
-  net_position = 0  # in BTC
-
-  for _, row in trades_df_sorted.iterrows():
-    price = get_price_at_date(row["tradedTime"], market_df)
-    if price is None:
-      continue
-    if row["decision"].upper() == "BUY":
-      total_buy_cost += price * row["amount"]
-      net_position += row["amount"]
-    elif row["decision"].upper() == "SELL":
-      total_sell_revenue += price * row["amount"]
-      net_position -= row["amount"]
-
-  if net_position > 0:
-    # Use the latest market close for open positions
-    current_price = market_df.iloc[-1]["close"]
-    open_position_value = current_price * net_position
-  else:
-    open_position_value = 0
-
-  final_value = total_sell_revenue + open_position_value
+  total_buy_cost = rollups_df["buyVolume"].sum()
   if total_buy_cost > 0:
-    strategy_return = (final_value - total_buy_cost) / total_buy_cost * 100
-  else:
-    strategy_return = 0
-  return strategy_return
-
-def compute_market_return(market_df):
-  """Computes market return from the first available price to the latest price."""
-  first_price = market_df.iloc[0]["close"]
-  last_price = market_df.iloc[-1]["close"]
-  market_return = (last_price - first_price) / first_price * 100
-  return market_return
+    return rollups_df.iloc[-1]["totalPnl"] / total_buy_cost * 100
+  return 0
 
 def main():
   st.title("AI Bitcoin Trading Bot Dashboard")
@@ -99,7 +46,7 @@ def main():
   # Load data from the Prisma DB
   with st.spinner("Loading data from the database..."):
     try:
-      trades, reflections, insights = asyncio.run(load_data())
+      trades, reflections, insights, rollups = asyncio.run(load_data())
     except Exception as e:
       st.error(f"Error loading data from DB: {e}")
       return
@@ -108,48 +55,56 @@ def main():
   trades_columns = ["id", "decision", "reason", "amount", "tradedTime", "reflectionId"]
   reflections_columns = ["id", "reflection", "recommendedActions", "marketTrends", "insightsId"]
   insights_columns = ["id", "successes", "challenges"]
+  rollups_columns = [
+    "bucket", "buyCount", "sellCount", "holdCount", "buyVolume", "krwVolume",
+    "realizedPnl", "totalPnl", "closePrice", "marketReturn"
+  ]
 
   trades_df = convert_to_dataframe(trades, trades_columns)
   reflections_df = convert_to_dataframe(reflections, reflections_columns)
   insights_df = convert_to_dataframe(insights, insights_columns)
+  rollups_df = convert_to_dataframe(rollups, rollups_columns)
 
-  # Ensure tradedTime is in datetime format and determine the start date for market data
-  if not trades_df.empty:
-    trades_df["tradedTime"] = pd.to_datetime(trades_df["tradedTime"])
-    min_trade_date = trades_df["tradedTime"].min().date()
-  else:
-    st.warning("No trade data available. Using a default 30-day period for market data.")
-    min_trade_date = datetime.date.today() - datetime.timedelta(days=30)
+  has_rollups = not rollups_df.empty
+  if has_rollups:
+    rollups_df = rollups_df.set_index("bucket")
 
-  # Fetch market data using pyupbit
-  market_df = get_market_data(min_trade_date)
+    # Compute performance returns from the pre-aggregated daily rows
+    strategy_return = compute_strategy_return(rollups_df)
+    market_return = rollups_df.iloc[-1]["marketReturn"]
 
-  # Compute performance returns
-  strategy_return = compute_strategy_return(trades_df, market_df) if not trades_df.empty else 0
-  market_return = compute_market_return(market_df)
+    st.subheader("Performance Metrics")
+    col1, col2 = st.columns(2)
+    col1.metric("Strategy Return", f"{strategy_return:.2f}%")
+    col2.metric("Market Return", f"{market_return:.2f}%")
 
-  st.subheader("Performance Metrics")
-  col1, col2 = st.columns(2)
-  col1.metric("Strategy Return", f"{strategy_return:.2f}%")
-  col2.metric("Market Return", f"{market_return:.2f}%")
+    # Display a chart for the market price
+    st.subheader("Market Price (KRW-BTC)")
+    st.line_chart(rollups_df["closePrice"])
 
-  # Display a chart for the market price
-  st.subheader("Market Price (KRW-BTC)")
-  st.line_chart(market_df["close"])
+    st.subheader("Total Profit (KRW)")
+    st.line_chart(rollups_df["totalPnl"])
+  else:
+    st.warning("No performance rollups available yet. Run `python src/rollup.py` to build them.")
 
   # Create tabs to show detailed data from the DB
   tab1, tab2, tab3 = st.tabs(["Trades", "Reflections", "Insights"])
 
   with tab1:
     st.header("Trade History")
-    if not trades_df.empty:
-      st.dataframe(trades_df.sort_values(by="tradedTime", ascending=False))
-      st.subheader("Trade Amounts Over Time")
-      trades_sorted = trades_df.sort_values("tradedTime")
-      st.line_chart(trades_sorted.set_index("tradedTime")["amount"])
+    if has_rollups:
+      st.subheader("Daily Trade Volume (KRW)")
+      st.bar_chart(rollups_df["krwVolume"])
       st.subheader("Trade Decision Distribution")
-      decision_counts = trades_df["decision"].value_counts()
+      decision_counts = pd.Series({
+        "BUY": rollups_df["buyCount"].sum(),
+        "SELL": rollups_df["sellCount"].sum(),
+        "HOLD": rollups_df["holdCount"].sum(),
+      })
       st.bar_chart(decision_counts)
+    if not trades_df.empty:
+      st.subheader(f"Latest {RECENT_ROWS} Trades")
+      st.dataframe(trades_df)
     else:
       st.write("No trade data available.")
 
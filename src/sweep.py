@@ -0,0 +1,331 @@
+import argparse
+import asyncio
+import datetime
+import hashlib
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+import pyupbit
+
+import openai_integration as ai
+import db_integration as db
+import schemas
+import snapshots
+from prompts import load_prompt, list_prompts
+
+SWEEP_DIR = os.getenv(
+  "SWEEP_DIR",
+  os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sweeps")
+)
+
+# Candle dataset opened read-only by every worker process, see `_init_worker`
+_candles = None
+
+def build_candle_dataset(path: str, start: datetime.datetime):
+  """
+  Save hourly KRW-BTC open prices from `start` until now as a NumPy file for memory mapping.
+
+  The file holds a structured array with `time` (UTC epoch seconds of the candle start) and
+  `open` fields, sorted by time.
+  """
+
+  hours = int((datetime.datetime.now(datetime.timezone.utc) - start).total_seconds() // 3600) + 2
+  df = pyupbit.get_ohlcv("KRW-BTC", interval="minute60", count=hours)
+  if df is None:
+    raise Exception("Failed to fetch market data from pyupbit")
+
+  candles = np.empty(len(df), dtype=[("time", "i8"), ("open", "f8")])
+  candles["time"] = df.index.tz_localize("Asia/Seoul").tz_convert("UTC").asi8 // 10**9
+  candles["open"] = df["open"].to_numpy()
+  os.makedirs(os.path.dirname(path), exist_ok=True)
+  np.save(path, candles)
+
+def _init_worker(candles_path: str):
+  global _candles
+  # Every worker maps the same file, so the pages are shared instead of copied
+  _candles = np.load(candles_path, mmap_mode="r")
+
+def _covers(candles, timestamp: float) -> bool:
+  return len(candles) > 0 and candles["time"][0] <= timestamp < candles["time"][-1] + 3600
+
+def _price_at(timestamp: float) -> float:
+  """
+  Open of the hourly candle that contains `timestamp`.
+
+  The open is the last price known when the decision was made. The close of the same candle
+  would fill the trade at a price from up to an hour in the future.
+
+  Raises:
+    ValueError: If the candle dataset does not cover `timestamp`.
+  """
+
+  if not _covers(_candles, timestamp):
+    raise ValueError("No hourly candle covers {0}".format(
+      datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).isoformat()
+    ))
+  i = int(np.searchsorted(_candles["time"], timestamp, side="right")) - 1
+  return float(_candles["open"][i])
+
+def config_key(config: dict) -> str:
+  return hashlib.sha1(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+def cycles_key(cycles: list) -> str:
+  """Identify a set of recorded cycles by the trade ids and input snapshots they hold."""
+  ids = [[cycle["tradeId"], cycle["manifestHash"]] for cycle in cycles]
+  return hashlib.sha1(json.dumps(ids).encode("utf-8")).hexdigest()[:12]
+
+def _cycle_time(cycle: dict) -> float:
+  return datetime.datetime.fromisoformat(cycle["tradedTime"]).timestamp()
+
+def _dataset_covers(candles_path: str, cycles: list) -> bool:
+  """Whether the saved candle dataset has open prices for the first and last cycle."""
+  if not os.path.exists(candles_path):
+    return False
+  candles = np.load(candles_path)
+  if "open" not in candles.dtype.names:
+    return False
+  return _covers(candles, _cycle_time(cycles[0])) and _covers(candles, _cycle_time(cycles[-1]))
+
+def _json_list_length(value: str) -> int:
+  try:
+    value = json.loads(value)
+  except (ValueError, TypeError):
+    return 0
+  return len(value) if isinstance(value, list) else 0
+
+def limit_grid(grid: list, cycles: list) -> list:
+  """
+  Drop configurations asking for more news articles or past trades than any cycle recorded.
+
+  Snapshots only hold what the bot collected at the time, so larger values would repeat the
+  configuration with the largest recorded value and spend AI calls on the same results.
+
+  Raises:
+    Exception: If no configuration is left.
+  """
+
+  inputs = [snapshots.load_snapshot(cycle["manifestHash"]) for cycle in cycles]
+  news_limit = max(_json_list_length(i["news_data"]) for i in inputs)
+  history_limit = max(_json_list_length(i["past_trading_data"]) for i in inputs)
+
+  limited = [
+    config for config in grid
+    if config["news_page_size"] <= news_limit and config["history_depth"] <= history_limit
+  ]
+  if len(limited) < len(grid):
+    print("Dropped {0} configurations: the cycles recorded at most {1} news articles and {2} past trades".format(
+      len(grid) - len(limited), news_limit, history_limit
+    ))
+  if not limited:
+    raise Exception("Every configuration asks for more news articles or past trades than were recorded")
+  return limited
+
+def _truncate_json_list(value: str, count: int) -> str:
+  try:
+    return json.dumps(json.loads(value)[:count])
+  except (ValueError, TypeError):
+    return value
+
+def evaluate_config(config: dict, cycles: list) -> dict:
+  """
+  Simulate the bot over the recorded cycles with one configuration.
+
+  The portfolio starts with the balances of the first recorded cycle. For every cycle, the stored
+  inputs are adjusted to the configuration (prompt variant, number of news articles, number of
+  past trades, trade fee) and to the simulated balances, the AI is asked for a decision and the
+  clamped trade is filled at the hourly open from the shared candle dataset.
+
+  Returns:
+    dict: The configuration with its final return, buy and hold return, max drawdown,
+      number of trades and failed AI calls.
+  """
+
+  template = load_prompt(config["prompt"])
+  first_inputs = snapshots.load_snapshot(cycles[0]["manifestHash"])
+  first_price = _price_at(_cycle_time(cycles[0]))
+  krw = float(first_inputs["current_krw_balance"])
+  btc = float(first_inputs["current_btc_balance"]) / first_price
+  start_equity = krw + btc * first_price
+  fee = config["trade_fee"] / 100
+
+  peak = start_equity
+  max_drawdown = 0.0
+  trades = 0
+  errors = 0
+  price = first_price
+  started = time.monotonic()
+
+  for cycle in cycles:
+    inputs = snapshots.load_snapshot(cycle["manifestHash"])
+    inputs.pop("prompt", None)
+    price = _price_at(_cycle_time(cycle))
+
+    inputs.update(
+      current_krw_balance=krw,
+      current_btc_balance=btc * price,
+      trade_fee=config["trade_fee"],
+      news_data=_truncate_json_list(inputs["news_data"], config["news_page_size"]),
+      past_trading_data=_truncate_json_list(inputs["past_trading_data"], config["history_depth"]),
+    )
+    prompt = ai.build_trade_decision_prompt(template=template, **inputs)
+
+    try:
+      trade = ai.request_trade_decision(prompt, config["model"], config["reasoning_effort"])
+    except Exception:
+      errors += 1
+      continue
+    trade = schemas.clamp_trade(trade, krw, btc * price, config["trade_fee"])
+
+    if trade["decision"] == "BUY":
+      krw -= trade["amount"]
+      btc += trade["amount"] * (1 - fee) / price
+      trades += 1
+    elif trade["decision"] == "SELL":
+      sold = min(trade["amount"] / price, btc)
+      btc -= sold
+      krw += sold * price * (1 - fee)
+      trades += 1
+
+    equity = krw + btc * price
+    peak = max(peak, equity)
+    max_drawdown = max(max_drawdown, (peak - equity) / peak * 100)
+
+  return {
+    **config,
+    "key": config_key(config),
+    "return": ((krw + btc * price) - start_equity) / start_equity * 100,
+    "buyAndHoldReturn": (price - first_price) / first_price * 100,
+    "maxDrawdown": max_drawdown,
+    "trades": trades,
+    "errors": errors,
+    "cycles": len(cycles),
+    "duration": time.monotonic() - started,
+  }
+
+def make_grid(
+  prompts: list,
+  news_page_sizes: list,
+  history_depths: list,
+  trade_fees: list,
+  models: list
+) -> list:
+  """
+  Build every combination of the given values.
+
+  Models are given as "model" or "model:reasoning_effort", eg., o3-mini:medium or gpt-4o-mini.
+  """
+
+  grid = []
+  for prompt, news_page_size, history_depth, trade_fee, model in itertools.product(
+    prompts, news_page_sizes, history_depths, trade_fees, models
+  ):
+    model_name, _, reasoning_effort = model.partition(":")
+    grid.append({
+      "prompt": prompt,
+      "news_page_size": news_page_size,
+      "history_depth": history_depth,
+      "trade_fee": trade_fee,
+      "model": model_name,
+      "reasoning_effort": reasoning_effort or None,
+    })
+  return grid
+
+def run_sweep(
+  grid: list,
+  first_trade_id: int = None,
+  last_trade_id: int = None,
+  name: str = "default",
+  workers: int = None
+) -> pd.DataFrame:
+  """
+  Evaluate every configuration of the grid over the recorded cycles in a process pool.
+
+  Results are appended to `<SWEEP_DIR>/<name>/<cycles key>/results.jsonl` as soon as each
+  configuration finishes, and configurations already in that file are skipped, so an
+  interrupted sweep resumes where it stopped. The cycles key comes from `cycles_key`, so
+  results over a different trade id range never count as done. The candle dataset is shared by
+  every range of the sweep and rebuilt when it does not cover the first and last cycle.
+  Configurations asking for more news articles or past trades than were recorded are dropped,
+  see `limit_grid`.
+
+  Parameters:
+    grid (list): Configurations from `make_grid`.
+    first_trade_id (int): First recorded trade to simulate.
+    last_trade_id (int): Last recorded trade to simulate.
+    name (str): Name of the sweep directory holding the candle dataset and results.
+    workers (int): Worker processes, all cores by default.
+
+  Returns:
+    pandas.DataFrame: Every result of the sweep, ranked by return.
+  """
+
+  cycles = asyncio.run(db.get_snapshots(first_trade_id, last_trade_id))
+  if not cycles:
+    raise Exception("No recorded cycles with snapshots in the requested range")
+  grid = limit_grid(grid, cycles)
+
+  candles_path = os.path.join(SWEEP_DIR, name, "candles.npy")
+  sweep_dir = os.path.join(SWEEP_DIR, name, cycles_key(cycles))
+  results_path = os.path.join(sweep_dir, "results.jsonl")
+  os.makedirs(sweep_dir, exist_ok=True)
+
+  if not _dataset_covers(candles_path, cycles):
+    build_candle_dataset(candles_path, datetime.datetime.fromisoformat(cycles[0]["tradedTime"]))
+
+  results = []
+  if os.path.exists(results_path):
+    with open(results_path, "r", encoding="utf-8") as f:
+      results = [json.loads(line) for line in f if line.strip()]
+  done = {result["key"] for result in results}
+  pending = [config for config in grid if config_key(config) not in done]
+  print("{0} configurations, {1} already done, {2} cycles each".format(len(grid), len(done), len(cycles)))
+
+  with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker, initargs=(candles_path,)) as executor:
+    futures = [executor.submit(evaluate_config, config, cycles) for config in pending]
+    with open(results_path, "a", encoding="utf-8") as f:
+      for future in as_completed(futures):
+        result = future.result()
+        f.write(json.dumps(result) + "\n")
+        f.flush()
+        results.append(result)
+        print("{key}: {return:.2f}% ({prompt}, news {news_page_size}, history {history_depth}, fee {trade_fee}%, {model})".format(**result))
+
+  if not results:
+    return pd.DataFrame()
+  ranked = pd.DataFrame(results).sort_values("return", ascending=False).reset_index(drop=True)
+  ranked.to_csv(os.path.join(sweep_dir, "ranked.csv"), index=False)
+  return ranked
+
+def _parse_list(value: str, cast=str) -> list:
+  return [cast(item) for item in value.split(",") if item]
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Compare strategy and prompt variants over recorded cycles.")
+  parser.add_argument("--name", default="default", help="Sweep name, used to resume and store results")
+  parser.add_argument("--from", dest="first", type=int, help="First trade id to simulate")
+  parser.add_argument("--to", dest="last", type=int, help="Last trade id to simulate")
+  parser.add_argument("--prompts", default=",".join(list_prompts("trade_decision")))
+  parser.add_argument("--news-page-sizes", default="10")
+  parser.add_argument("--history-depths", default="10")
+  parser.add_argument("--trade-fees", default=os.getenv("TRADE_FEE", "0.05"))
+  parser.add_argument("--models", default="o3-mini:high")
+  parser.add_argument("--workers", type=int)
+  args = parser.parse_args()
+
+  grid = make_grid(
+    _parse_list(args.prompts),
+    _parse_list(args.news_page_sizes, int),
+    _parse_list(args.history_depths, int),
+    _parse_list(args.trade_fees, float),
+    _parse_list(args.models),
+  )
+  ranked = run_sweep(grid, args.first, args.last, args.name, args.workers)
+  print(ranked[[
+    "return", "buyAndHoldReturn", "maxDrawdown", "trades", "errors",
+    "prompt", "news_page_size", "history_depth", "trade_fee", "model", "reasoning_effort"
+  ]].to_string())